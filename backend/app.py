@@ -3,34 +3,49 @@ from pathlib import Path as _Path
 load_dotenv(dotenv_path=_Path(__file__).with_name('.env'), override=False)
 
 import os
-import re
+import glob
+import hashlib
+import json
 import uuid
-from datetime import datetime
-import time
-from flask import Flask, request, jsonify, send_file
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from pdf2image import convert_from_path
-import pytesseract
 from fpdf import FPDF
-import whisper
 import librosa
 import soundfile as sf
-from translate import translate_text_to_english, generate_chat_response
+from translate import (
+    translate_text_to_english,
+    translate_pages,
+    generate_chat_response,
+    stream_chat_response,
+    translation_cache,
+    purge_stale_translations,
+)
+from ocr import extract_text_from_image, ocr_pages, iter_pdf_pages, pdf_page_count, detect_document_language
+from audio import transcribe_audio, warm_up as warm_up_whisper
 from supabase_client import (
     sb_available,
     supabase,
-    insert_document,
-    insert_translation,
+    insert_translations_bulk,
     get_translations_for_document,
     get_document_metadata,
+    document_cache,
+    invalidate_document,
     get_or_create_chat,
     insert_message,
+    insert_messages,
     get_user_documents,
     get_chat_messages,
     get_user_chat_for_document,
     delete_user_document,
 )
+from retrieval import index_document, index_translations, retrieve_context
+from embeddings import delete_document as delete_document_embeddings
+from jobs import create_job, update_job, get_job, submit_job, set_worker_initializer
+from reaper import reap_document_files
+from artifacts import write_manifest, read_manifest
 
 app = Flask(__name__)
 CORS(app)
@@ -41,300 +56,20 @@ ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "mp3", "wav", "m4a", "flac",
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Uploaded files and generated PDFs never change once written under a document id
+FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
 
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-def detect_document_language(file_path):
-    """
-    Detect the primary language of the document by trying different OCR languages
-    """
-    try:
-        # Check if it's a PDF file
-        if file_path.lower().endswith('.pdf'):
-            # For PDFs, convert first page to image for language detection
-            try:
-                from pdf2image import convert_from_path
-                images = convert_from_path(file_path, dpi=150, first_page=1, last_page=1)
-                if not images:
-                    print(f"[language_detection] Failed to convert PDF to image: {file_path}")
-                    return "nep"  # Default fallback
-                
-                # Use the first page image for language detection
-                import tempfile
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                    images[0].save(tmp_file.name, 'PNG')
-                    temp_image_path = tmp_file.name
-            except Exception as e:
-                print(f"[language_detection] PDF conversion failed: {e}")
-                return "nep"  # Default fallback
-        else:
-            # For image files, use directly
-            temp_image_path = file_path
-        
-        # Try different language combinations and see which gives the best results
-        language_candidates = [
-            ("nep", "nep+eng"),  # Nepali first (most common)
-            ("sin", "sin+eng"),  # Sinhala second
-            ("eng", "eng"),      # English last
-        ]
-        
-        best_lang = "nep"  # Default fallback
-        max_text_length = 0
-        
-        for lang_code, lang_string in language_candidates:
-            try:
-                # Quick OCR test with basic config
-                test_text = pytesseract.image_to_string(temp_image_path, lang=lang_string, config="--psm 6")
-                if test_text and test_text.strip():
-                    # Count meaningful characters (not just numbers/symbols)
-                    meaningful_chars = len([c for c in test_text if c.isalpha() or c.isspace()])
-                    if meaningful_chars > max_text_length:
-                        max_text_length = meaningful_chars
-                        best_lang = lang_code
-            except Exception as e:
-                print(f"Language detection failed for {lang_string}: {e}")
-                continue
-        
-        # Clean up temporary file if we created one
-        if temp_image_path != file_path:
-            try:
-                os.unlink(temp_image_path)
-            except:
-                pass
-        
-        print(f"[language_detection] Detected language: {best_lang} (text length: {max_text_length})")
-        return best_lang
-    except Exception as e:
-        print(f"[language_detection] Error: {e}")
-        return "nep"  # Default fallback
-
-
-def extract_text_from_image(image_path, lang="nep"):
-    """
-    Enhanced OCR text extraction with preprocessing and cleaning
-    """
-    from PIL import Image, ImageEnhance, ImageFilter
-    
-    # First, try to preprocess the image for better OCR
-    try:
-        img = Image.open(image_path)
-        
-        # Convert to grayscale for better OCR
-        if img.mode != 'L':
-            img = img.convert('L')
-        
-        # Ultra-conservative preprocessing for Nepali text
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.1)  # Minimal contrast enhancement
-        
-        # Skip noise reduction to preserve text details
-        # Skip sharpening to preserve original text clarity
-        
-        # Save the preprocessed image temporarily
-        temp_path = image_path.replace('.', '_processed.')
-        img.save(temp_path)
-        processed_image_path = temp_path
-    except Exception as e:
-        print(f"Image preprocessing failed: {e}")
-        processed_image_path = image_path
-    
-    requested = lang or "nep"
-    candidates = [
-        f"{requested}+eng",
-        requested,
-        f"{requested}+sin+eng",
-        "script/Devanagari+eng",
-        "nep+eng",
-        "sin+eng",
-        "eng",
-    ]
-    
-    # Ultra-conservative OCR configurations for Nepali text
-    configs = [
-        "--oem 3 --psm 6",  # Uniform block with LSTM (most accurate)
-        "--oem 3 --psm 7",  # Single text line with LSTM
-    ]
+# Pages per /metadata window (default ?limit= and NDJSON fetch size); windows are capped at METADATA_MAX_PAGES
+METADATA_PAGE_WINDOW = int(os.getenv("METADATA_PAGE_WINDOW", "20"))
+METADATA_MAX_PAGES = int(os.getenv("METADATA_MAX_PAGES", "200"))
 
-    best_text = ""
-    max_reasonable_length = 0
-
-    for langs in candidates:
-        for cfg in configs:
-            try:
-                txt = pytesseract.image_to_string(processed_image_path, lang=langs, config=cfg)
-                if txt and txt.strip():
-                    cleaned_txt = clean_ocr_text(txt, target_lang=requested)
-                    # Prefer longer, more reasonable text
-                    if len(cleaned_txt.strip()) > max_reasonable_length and is_reasonable_ocr_output(cleaned_txt, target_lang=requested):
-                        best_text = cleaned_txt
-                        max_reasonable_length = len(cleaned_txt.strip())
-            except Exception as e:
-                print(f"OCR failed with {langs}, {cfg}: {e}")
-                pass
-    
-    # Clean up temp file
-    try:
-        if processed_image_path != image_path:
-            os.unlink(processed_image_path)
-    except Exception:
-        pass
-        
-    return best_text
-
-
-def remove_repeated_characters(text):
-    """
-    Remove lines with excessive character repetition (OCR artifacts)
-    """
-    lines = text.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        # Skip lines with excessive repetition (more than 3 consecutive same characters)
-        if re.search(r'(.)\1{3,}', line):
-            continue
-        
-        # Skip lines that are mostly the same character (more than 60% same character)
-        if len(line.strip()) > 5:
-            char_counts = {}
-            for char in line.strip():
-                char_counts[char] = char_counts.get(char, 0) + 1
-            
-            max_count = max(char_counts.values())
-            if max_count / len(line.strip()) > 0.6:
-                continue
-        
-        # Skip lines with common OCR noise patterns
-        if re.search(r'\b(jey|ve|je|ye|ey)\b', line.lower()):
-            continue
-        
-        cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines)
-
-
-def clean_ocr_text(text, target_lang="nep"):
-    """
-    Clean OCR output by removing unwanted characters and artifacts
-    """
-    
-    # First remove repeated character patterns
-    text = remove_repeated_characters(text)
-    
-    # Remove common OCR artifacts but preserve more characters
-    text = re.sub(r'[^\w\s\u0900-\u097F\u0D80-\u0DFF\n।॥.,!?;:()]', '', text)  # Keep punctuation and more characters
-    
-    # Remove standalone English words that are likely OCR errors
-    if target_lang in ["nep", "nepali"]:
-        # Split into lines and clean each line
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # If line contains mostly English words (excluding Devanagari), be more conservative
-            devanagari_chars = re.findall(r'[\u0900-\u097F]', line)
-            if len(devanagari_chars) == 0:
-                # Only skip very short English-only lines that are likely noise
-                if len(line.strip().split()) <= 1:  # Only skip single word lines
-                    continue
-            
-            # Remove standalone English words that are likely OCR errors
-            words = line.split()
-            filtered_words = []
-            for word in words:
-                devanagari_in_word = re.findall(r'[\u0900-\u097F]', word)
-                english_in_word = re.findall(r'[a-zA-Z]', word)
-                
-                # Skip standalone English words that are likely OCR errors
-                if not devanagari_in_word and english_in_word:
-                    # Skip common OCR noise words (including variations)
-                    noise_words = [
-                        'jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be',
-                        'jeyy', 'jeyyy', 'jeyyyy', 'jeyyyyy',  # Repeated jey variations
-                        'vey', 'veyy', 'veyyy',  # Vey variations
-                        'jey', 'jeyjey', 'jeyjeyjey',  # Jey repetitions
-                        'je', 'jeje', 'jejeje',  # Je repetitions
-                        'ye', 'yeye', 'yeyeye',  # Ye repetitions
-                        'ey', 'eyey', 'eyeyey',  # Ey repetitions
-                        'y', 'yy', 'yyy', 'yyyy', 'yyyyy',  # Y repetitions
-                        'e', 'ee', 'eee', 'eeee', 'eeeee',  # E repetitions
-                        'j', 'jj', 'jjj', 'jjjj', 'jjjjj',  # J repetitions
-                        'v', 'vv', 'vvv', 'vvvv', 'vvvvv',  # V repetitions
-                    ]
-                    if word.lower() in noise_words:
-                        continue
-                    # Skip short English-only words (likely OCR errors)
-                    if len(word) <= 3:
-                        continue
-                    # Skip words with excessive character repetition
-                    if re.search(r'(.)\1{2,}', word.lower()):  # 3+ consecutive same characters
-                        continue
-                
-                filtered_words.append(word)
-            
-            cleaned_line = ' '.join(filtered_words)
-            if cleaned_line.strip():
-                cleaned_lines.append(cleaned_line)
-        
-        return '\n'.join(cleaned_lines)
-    
-    elif target_lang in ["sin", "sinhala"]:
-        # Sinhala-specific cleaning
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # If line contains mostly English words (excluding Sinhala), skip simple English words
-            sinhala_chars = re.findall(r'[\u0D80-\u0DFF]', line)
-            if len(sinhala_chars) == 0:
-                # If no Sinhala characters, this might be OCR noise
-                if len(line.strip().split()) <= 2:  # Skip short English-only lines
-                    continue
-            
-            # Remove standalone English words that are likely OCR errors
-            words = line.split()
-            filtered_words = []
-            for word in words:
-                sinhala_in_word = re.findall(r'[\u0D80-\u0DFF]', word)
-                english_in_word = re.findall(r'[a-zA-Z]', word)
-                
-                # Skip standalone English words that are likely OCR errors
-                if not sinhala_in_word and english_in_word:
-                    # Skip common OCR noise words
-                    noise_words = ['jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be']
-                    if word.lower() in noise_words:
-                        continue
-                    # Skip short English-only words (likely OCR errors)
-                    if len(word) <= 3:
-                        continue
-                
-                filtered_words.append(word)
-            
-            cleaned_line = ' '.join(filtered_words)
-            if cleaned_line.strip():
-                cleaned_lines.append(cleaned_line)
-        
-        return '\n'.join(cleaned_lines)
-    
-    return text
+# Upload workers load Whisper once at start instead of on the first audio job
+if os.getenv("WHISPER_PRELOAD", "1") == "1":
+    set_worker_initializer(warm_up_whisper)
 
 
-def is_reasonable_ocr_output(text, target_lang="nep"):
-    """
-    Check if OCR output looks reasonable for the target language
-    """
-    if target_lang in ["nep", "nepali"]:
-        # Should contain Devanagari characters
-        devanagari_chars = re.findall(r'[\u0900-\u097F]', text)
-        return len(devanagari_chars) > 0
-    elif target_lang in ["sin", "sinhala"]:
-        # Should contain Sinhala characters
-        sinhala_chars = re.findall(r'[\u0D80-\u0DFF]', text)
-        return len(sinhala_chars) > 0
-    
-    return True
+def allowed_file(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
 def text_to_pdf(text, output_path, font_path):
@@ -352,93 +87,74 @@ def text_to_pdf(text, output_path, font_path):
     pdf.output(output_path)
 
 
+# Bump when text_to_pdf output changes so cached downloads are re-rendered
+DOWNLOAD_PDF_VERSION = "1"
+
+
+def download_pdf_digest(translated_text):
+    """Content hash of a download PDF: the ETag and part of its cache file name."""
+    h = hashlib.sha256(DOWNLOAD_PDF_VERSION.encode("utf-8"))
+    h.update(translated_text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def cached_download_pdf(document_id, translated_text):
+    """
+    Path of the rendered download PDF for this text, rendering it only when no
+    file exists for its hash. Older renders of the document are removed.
+    """
+    digest = download_pdf_digest(translated_text)
+    pdf_path = os.path.abspath(os.path.join(DATA_DIR, f"{document_id}_download-{digest[:16]}.pdf"))
+    if os.path.exists(pdf_path):
+        return digest, pdf_path
+
+    tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        text_to_pdf(translated_text, tmp_path, None)  # None for font_path uses default Arial
+        os.replace(tmp_path, pdf_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for stale in glob.glob(os.path.join(os.path.dirname(pdf_path), f"{glob.escape(document_id)}_download*.pdf")):
+        if stale != pdf_path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return digest, pdf_path
+
+
 def is_audio_file(filename):
     """Check if the file is an audio file"""
     audio_extensions = {"mp3", "wav", "m4a", "flac", "ogg"}
     return "." in filename and filename.rsplit(".", 1)[1].lower() in audio_extensions
 
 
-def transcribe_audio(file_path):
-    """
-    Transcribe audio file to text using Whisper
-    """
-    try:
-        # Load Whisper model (base model for good balance of speed/accuracy)
-        # Handle SSL certificate issues
-        import ssl
-        ssl._create_default_https_context = ssl._create_unverified_context
-        
-        model = whisper.load_model("base")
-        
-        # Transcribe the audio
-        result = model.transcribe(file_path)
-        
-        # Extract text from result
-        text = result["text"].strip()
-        
-        if not text:
-            return None, "No speech detected in audio file"
-        
-        return text, None
-        
-    except Exception as e:
-        return None, f"Error transcribing audio: {str(e)}"
+class UploadError(Exception):
+    """Raised by the upload pipeline; the message is reported on the job."""
 
 
-def detect_audio_language(file_path):
+def process_upload(doc_id, file_path, filename, user_id, progress=None):
     """
-    Detect the language of the audio content
+    Full upload pipeline (language detection, OCR / transcription, translation,
+    PDF generation, Supabase writes). Runs in a jobs worker process; progress
+    is called with the current stage and page counters.
     """
-    try:
-        # Handle SSL certificate issues
-        import ssl
-        ssl._create_default_https_context = ssl._create_unverified_context
-        
-        model = whisper.load_model("base")
-        result = model.transcribe(file_path)
-        
-        # Get detected language
-        detected_lang = result.get("language", "unknown")
-        
-        # Map Whisper language codes to our language names
-        lang_mapping = {
-            "si": "sinhala",  # Sinhala
-            "ne": "nepali",   # Nepali
-            "en": "english",  # English
-            "hi": "nepali",   # Hindi (treat as Nepali for our purposes)
-        }
-        
-        return lang_mapping.get(detected_lang, "unknown")
-        
-    except Exception as e:
-        print(f"Error detecting audio language: {e}")
-        return "unknown"
+    if progress is None:
+        progress = lambda stage, **fields: None
 
-
-@app.route("/upload", methods=["POST"])
-def upload_file():
-    user_id = request.form.get("user_id")
-    if not user_id:
-        return jsonify({"error": "Missing user ID"}), 400
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    file = request.files["file"]
-    if not file or file.filename == "" or not allowed_file(file.filename):
-        return jsonify({"error": "Invalid file"}), 400
-
-    filename = secure_filename(file.filename)
-    doc_id = str(uuid.uuid4())
     ext = filename.rsplit(".", 1)[1].lower()
-    file_path = os.path.join(UPLOAD_DIR, f"{doc_id}.{ext}")
-    file.save(file_path)
-
     page_count = 1
     
-    # Detect the document language (skip for audio files)
+    # Detect the document language (skip for audio files). The detection pass
+    # over the first page is reused as that page's first OCR candidate.
+    first_page_ocr = None
     if is_audio_file(filename):
         detected_lang = "unknown"  # Will be detected later by Whisper
     else:
-        detected_lang = detect_document_language(file_path)
+        progress("detecting_language")
+        detected_lang, first_page_ocr = detect_document_language(file_path)
     language = detected_lang
 
     native_texts = []
@@ -453,33 +169,31 @@ def upload_file():
         print(f"Processing audio file: {filename}")
         
         try:
-            # Transcribe audio to text
+            # Transcribe audio to text; the same Whisper pass detects the language
             print(f"[audio] Starting transcription for {filename}")
-            native_text, error = transcribe_audio(file_path)
+            progress("transcribing", page_count=page_count)
+            transcription, error = transcribe_audio(file_path)
             if error:
                 print(f"[audio] Transcription error: {error}")
-                return jsonify({"error": f"Audio transcription failed: {error}"}), 500
-            
-            if not native_text.strip():
-                print(f"[audio] No speech detected in {filename}")
-                return jsonify({"error": "No speech detected in audio file"}), 400
-            
-            print(f"[audio] Transcription successful: {len(native_text)} characters")
+                raise UploadError(f"Audio transcription failed: {error}")
             
-            # Detect audio language
-            print(f"[audio] Detecting language for {filename}")
-            audio_lang = detect_audio_language(file_path)
-            language = audio_lang
-            print(f"[audio] Detected language: {audio_lang}")
+            native_text = transcription["text"]
+            language = transcription["language"]
+            print(f"[audio] Transcription successful: {len(native_text)} characters, "
+                  f"{len(transcription['segments'])} segments")
+            print(f"[audio] Detected language: {language} ({transcription['language_code']})")
             
             native_texts.append(native_text)
+            progress("translating")
             translated = translate_text_to_english(native_text)
             translated_texts.append(translated)
             print(f"[audio] Translation successful: {len(translated)} characters")
             
+        except UploadError:
+            raise
         except Exception as e:
             print(f"[audio] Error processing audio file: {e}")
-            return jsonify({"error": f"Audio processing failed: {str(e)}"}), 500
+            raise UploadError(f"Audio processing failed: {str(e)}")
         
         # Generate PDFs for audio transcription
         try:
@@ -487,21 +201,24 @@ def upload_file():
             english_pdf_font = ""  # Use default font for English
             
             print(f"[audio] Generating PDFs for {filename}")
+            progress("rendering", pages_done=1)
             text_to_pdf(native_text, native_pdf_path, native_pdf_font)
             if translated.strip():
                 text_to_pdf(translated, english_pdf_path, english_pdf_font)
             print(f"[audio] PDFs generated successfully")
         except Exception as e:
             print(f"[audio] PDF generation error: {e}")
-            return jsonify({"error": "Internal error generating PDF", "details": str(e)}), 500
+            raise UploadError(f"Internal error generating PDF: {str(e)}")
             
     elif ext in ["png", "jpg", "jpeg"]:
         # Use detected language for OCR
-        native_text = extract_text_from_image(file_path, lang=detected_lang)
+        progress("ocr", page_count=page_count)
+        native_text = extract_text_from_image(file_path, lang=detected_lang, seed=first_page_ocr)
         if not native_text.strip():
             # Fallback to mixed language OCR
             native_text = extract_text_from_image(file_path, lang=f"{detected_lang}+eng") or ""
         native_texts.append(native_text)
+        progress("translating", pages_done=1)
         translated = translate_text_to_english(native_text)
         translated_texts.append(translated)
         original_pdf_path = None
@@ -517,32 +234,40 @@ def upload_file():
             print(f"[pdf] Failed to store original PDF: {e}")
         
         try:
-            # Convert PDF to images with higher DPI for better OCR
-            images = convert_from_path(file_path, dpi=300)
-            page_count = len(images)
-            print(f"[pdf] Converted {page_count} pages from PDF")
+            page_count = pdf_page_count(file_path)
+            print(f"[pdf] PDF has {page_count} pages")
         except Exception as e:
-            return jsonify({"error": "PDF processing failed", "details": str(e)}), 500
+            raise UploadError(f"PDF processing failed: {str(e)}")
         
-        for i, img in enumerate(images):
-            # Use enhanced OCR extraction for PDF pages too
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                img.save(tmp_file.name, 'PNG')
-                print(f"[pdf] Processing page {i+1}/{page_count} with language: {detected_lang}")
-                text = extract_text_from_image(tmp_file.name, lang=detected_lang)
-                os.unlink(tmp_file.name)
-            
-            if text and text.strip():
-                print(f"[pdf] Extracted {len(text)} characters from page {i+1}")
-                native_texts.append(text)
-                translated_texts.append(translate_text_to_english(text))
-            else:
-                print(f"[pdf] No text extracted from page {i+1}")
-                native_texts.append("")
-                translated_texts.append("")
+        progress("ocr", page_count=page_count)
+        print(f"[pdf] OCR of {page_count} pages with language: {detected_lang}")
+        try:
+            # Pages are rasterized lazily (higher DPI for better OCR), OCR'd
+            # concurrently, and come back in page order
+            pages = iter_pdf_pages(file_path, dpi=300, page_count=page_count)
+            for page_number, text in ocr_pages(pages, lang=detected_lang, first_page_ocr=first_page_ocr):
+                if text and text.strip():
+                    print(f"[pdf] Extracted {len(text)} characters from page {page_number}")
+                    native_texts.append(text)
+                else:
+                    print(f"[pdf] No text extracted from page {page_number}")
+                    native_texts.append("")
+                progress("ocr", pages_done=page_number)
+        except Exception as e:
+            raise UploadError(f"PDF processing failed: {str(e)}")
+
+        # Pages are translated concurrently (short ones packed together), in page order
+        progress("translating", pages_done=0)
+        try:
+            translated_texts = translate_pages(
+                native_texts, on_page_done=lambda done: progress("translating", pages_done=done)
+            )
+        except Exception as e:
+            raise UploadError(f"Translation failed: {str(e)}")
+        print(f"[pdf] Translated {sum(1 for t in translated_texts if t.strip())} pages")
         
         # Generate translated PDF only
+        progress("rendering")
         english_pdf_font = ""  # Use default font for English
         english_pdf_path = os.path.join(DATA_DIR, f"{doc_id}_english.pdf")
         all_translated_text = "\n\n".join(translated_texts)
@@ -554,6 +279,13 @@ def upload_file():
             print(f"[pdf] Failed to generate translated PDF: {e}")
             english_pdf_path = None
 
+    # Chunk + embed once so chat can retrieve the relevant passages
+    progress("indexing")
+    try:
+        index_document(doc_id, filename, native_texts, translated_texts)
+    except Exception as e:
+        print(f"[rag] Failed to index document {doc_id}: {e}")
+
     if is_audio_file(filename):
         file_url = f"{doc_id}_native.pdf"  # Audio files are converted to PDFs
     elif ext in ["png", "jpg", "jpeg"]:
@@ -562,47 +294,141 @@ def upload_file():
         file_url = f"{doc_id}_original.pdf"  # PDFs show original file
 
     if sb_available():
-        insert_document(document_id=doc_id, user_id=user_id, title=filename, file_url=file_url,
-                        language=language, page_count=page_count)
-        for i, (orig, trans) in enumerate(zip(native_texts, translated_texts), start=1):
-            insert_translation(document_id=doc_id, original_text=orig or "", translated_text=trans or "", page_number=i)
+        progress("saving")
+        pages = [{"original_text": orig or "", "translated_text": trans or "", "page_number": i}
+                 for i, (orig, trans) in enumerate(zip(native_texts, translated_texts), start=1)]
+        document = {"user_id": user_id, "title": filename, "file_url": file_url,
+                    "language": language, "page_count": page_count}
+        if not insert_translations_bulk(doc_id, pages, document=document):
+            # The document row or some pages are missing; don't report it as done
+            try:
+                delete_document_embeddings(doc_id)
+            except Exception as e:
+                print(f"[rag] Failed to drop embeddings of {doc_id}: {e}")
+            raise UploadError("Saving the document failed; please upload it again")
 
-    return jsonify({
+    # /file/<id> serves from this manifest instead of probing for each variant
+    if is_audio_file(filename):
+        native_artifact = native_pdf_path
+    elif ext in ["png", "jpg", "jpeg"]:
+        native_artifact = file_path
+    else:
+        native_artifact = original_pdf_path
+    try:
+        write_manifest(DATA_DIR, doc_id, {"native": native_artifact, "english": english_pdf_path})
+    except Exception as e:
+        print(f"[artifacts] Failed to write manifest for {doc_id}: {e}")
+
+    return {
         "documentId": doc_id,
         "filename": filename,
         "numPages": page_count,
         "original_pdf_path": original_pdf_path if ext == "pdf" else None,
         "english_pdf_path": english_pdf_path,
         "file_ext": ext,
+    }
+
+
+@app.route("/upload", methods=["POST"])
+def upload_file():
+    user_id = request.form.get("user_id")
+    if not user_id:
+        return jsonify({"error": "Missing user ID"}), 400
+    if "file" not in request.files:
+        return jsonify({"error": "No file uploaded"}), 400
+    file = request.files["file"]
+    if not file or file.filename == "" or not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file"}), 400
+
+    filename = secure_filename(file.filename)
+    doc_id = str(uuid.uuid4())
+    ext = filename.rsplit(".", 1)[1].lower()
+    file_path = os.path.join(UPLOAD_DIR, f"{doc_id}.{ext}")
+    file.save(file_path)
+
+    # The pipeline runs in the jobs worker pool; clients poll /jobs/<job_id>
+    job_id = create_job(document_id=doc_id, user_id=user_id, filename=filename)
+    try:
+        submit_job(job_id, process_upload, doc_id=doc_id, file_path=file_path, filename=filename, user_id=user_id)
+    except Exception as e:
+        print(f"[upload] Failed to enqueue job {job_id}: {e}")
+        update_job(job_id, status="failed", stage="failed", error=str(e))
+        return jsonify({"error": "Failed to queue upload", "details": str(e)}), 500
+    print(f"[upload] Queued job {job_id} for document {doc_id}")
+
+    return jsonify({
+        "jobId": job_id,
+        "documentId": doc_id,
+        "filename": filename,
+        "file_ext": ext,
+        "status": "queued",
+    }), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """Report the stage and progress of an upload job"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] == "done":
+        # The worker process wrote the document; drop anything this process read mid-upload
+        invalidate_document(job["document_id"])
+    return jsonify({
+        "jobId": job["job_id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "pagesDone": job["pages_done"],
+        "pageCount": job["page_count"],
+        "documentId": job["document_id"] if job["status"] == "done" else None,
+        "result": job["result"],
+        "error": job["error"],
     })
 
 
 @app.route("/file/<document_id>")
 def get_file(document_id):
     lang = request.args.get("lang", "native")
+    view = "native" if lang == "native" else "english"
     
+    manifest = read_manifest(DATA_DIR, document_id)
+    if manifest is not None:
+        # Images have no English file, and PDFs fall back to the original
+        artifact = manifest.get(view) or manifest.get("native")
+        if not artifact:
+            return jsonify({"error": "File not found"}), 404
+        try:
+            # conditional=True answers Range (206) and If-None-Match / If-Modified-Since (304)
+            response = send_file(os.path.abspath(artifact["path"]), mimetype=artifact["mimetype"],
+                                 as_attachment=False, conditional=True, max_age=FILE_CACHE_MAX_AGE)
+        except FileNotFoundError:
+            return jsonify({"error": "File not found"}), 404
+        response.cache_control.immutable = True
+        return response
+    
+    # Documents uploaded before manifests were written
     # Check for image files first
     potential_img_extensions = ['png', 'jpg', 'jpeg']
     for ext in potential_img_extensions:
         potential_img_path = os.path.join(UPLOAD_DIR, f"{document_id}.{ext}")
         if os.path.exists(potential_img_path):
-            return send_file(potential_img_path, mimetype=f"image/{ext}", as_attachment=False)
+            return send_file(potential_img_path, mimetype=f"image/{ext}", as_attachment=False, conditional=True)
     
     # For PDFs, serve original for "native" and translated for "english"
-    if lang == "native":
+    if view == "native":
         # Serve original PDF
         original_pdf_path = os.path.join(DATA_DIR, f"{document_id}_original.pdf")
         if os.path.exists(original_pdf_path):
-            return send_file(original_pdf_path, mimetype="application/pdf", as_attachment=False)
+            return send_file(original_pdf_path, mimetype="application/pdf", as_attachment=False, conditional=True)
     else:
         # Serve translated PDF
         translated_pdf_path = os.path.join(DATA_DIR, f"{document_id}_english.pdf")
         if os.path.exists(translated_pdf_path):
-            return send_file(translated_pdf_path, mimetype="application/pdf", as_attachment=False)
+            return send_file(translated_pdf_path, mimetype="application/pdf", as_attachment=False, conditional=True)
         # Fallback to original if translated doesn't exist
         original_pdf_path = os.path.join(DATA_DIR, f"{document_id}_original.pdf")
         if os.path.exists(original_pdf_path):
-            return send_file(original_pdf_path, mimetype="application/pdf", as_attachment=False)
+            return send_file(original_pdf_path, mimetype="application/pdf", as_attachment=False, conditional=True)
     
     return jsonify({"error": "File not found"}), 404
 
@@ -689,92 +515,262 @@ def get_user_feedback(user_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
+def _page_window(args):
+    """
+    (first_page, last_page) from ?pages=3-20 / ?pages=7 or ?cursor=21&limit=20,
+    (None, None) for the whole document. Raises ValueError on a bad window.
+    """
+    pages = args.get("pages")
+    if pages:
+        first, _, last = pages.partition("-")
+        first = int(first)
+        last = int(last) if last else first
+    elif "cursor" in args or "limit" in args:
+        first = int(args.get("cursor", 1))
+        last = first + int(args.get("limit", METADATA_PAGE_WINDOW)) - 1
+    else:
+        return None, None
+    if first < 1 or last < first or last - first + 1 > METADATA_MAX_PAGES:
+        raise ValueError(f"pages must be a range of at most {METADATA_MAX_PAGES} pages starting at 1 or later")
+    return first, last
+
+
+def _page_payload(t):
+    return {"pageNumber": t["page_number"], "nativeText": t["original_text"] or "",
+            "translatedText": t["translated_text"] or ""}
+
+
+def _stream_metadata(document_id, doc_meta, first_page, last_page):
+    """NDJSON: a document line, then one line per page, fetched a window at a time."""
+    page_count = doc_meta.get("page_count")
+
+    def lines():
+        yield json.dumps({"filename": doc_meta["title"], "fileExt": doc_meta["file_url"].split(".")[-1].lower(),
+                          "pageCount": page_count}) + "\n"
+        start = first_page or 1
+        while last_page is None or start <= last_page:
+            end = start + METADATA_PAGE_WINDOW - 1
+            if last_page is not None:
+                end = min(end, last_page)
+            rows = get_translations_for_document(document_id, start, end)
+            for t in rows:
+                yield json.dumps(_page_payload(t)) + "\n"
+            if (page_count and end >= page_count) or (not page_count and not rows):
+                break
+            start = end + 1
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/metadata/<document_id>")
 def get_metadata(document_id):
+    """
+    Whole-document text by default. ?pages=1-20 or ?cursor=&limit= returns
+    that window as per-page entries with a nextCursor; ?format=ndjson (or
+    Accept: application/x-ndjson) streams the requested pages line by line.
+    """
     if not sb_available():
         return jsonify({"error": "Supabase not configured"}), 500
-    translations = get_translations_for_document(document_id)
+    try:
+        first_page, last_page = _page_window(request.args)
+    except ValueError as e:
+        return jsonify({"error": "Invalid page window", "details": str(e)}), 400
     doc_meta = get_document_metadata(document_id)
     if not doc_meta:
         return jsonify({"error": "Document not found"}), 404
+    file_ext = doc_meta["file_url"].split(".")[-1].lower()
+
+    if request.args.get("format") == "ndjson" or "application/x-ndjson" in (request.headers.get("Accept") or ""):
+        return _stream_metadata(document_id, doc_meta, first_page, last_page)
+
+    if first_page is not None:
+        translations = get_translations_for_document(document_id, first_page, last_page)
+        page_count = doc_meta.get("page_count")
+        if page_count:
+            has_more = last_page < page_count
+        else:
+            has_more = bool(translations) and translations[-1]["page_number"] >= last_page
+        print(f"[Metadata] {document_id}: pages {first_page}-{last_page}, {len(translations)} records")
+        return jsonify({
+            "filename": doc_meta["title"],
+            "fileExt": file_ext,
+            "pageCount": page_count,
+            "pages": [_page_payload(t) for t in translations],
+            "nextCursor": last_page + 1 if has_more else None,
+        })
+
+    translations = get_translations_for_document(document_id)
     native_text = "\n\n".join(t["original_text"] for t in translations if t["original_text"])
     translated_text = "\n\n".join(t["translated_text"] for t in translations if t["translated_text"])
-    
-    # Enhanced debug logging
-    print(f"[Metadata] Document ID: {document_id}")
-    print(f"[Metadata] Found {len(translations)} translation records")
-    print(f"[Metadata] Translation records:")
-    for i, t in enumerate(translations):
-        print(f"  Record {i}: page={t.get('page_number', 'N/A')}, text_len={len(t.get('translated_text', ''))}")
-        print(f"    Text preview: {t.get('translated_text', '')[:100]}...")
-    print(f"[Metadata] Combined text length: {len(translated_text)}")
-    print(f"[Metadata] First 200 chars: {translated_text[:200]}")
+    print(f"[Metadata] {document_id}: {len(translations)} records, {len(translated_text)} translated chars")
     
     return jsonify({
         "filename": doc_meta["title"],
-        "fileExt": doc_meta["file_url"].split(".")[-1].lower(),
+        "fileExt": file_ext,
         "nativeText": native_text,
         "translatedText": translated_text
     })
 
 
+NO_DOCUMENT_CONTENT_REPLY = "Sorry, I don't have access to the document content. Please make sure the document was processed successfully."
+
+
+def build_chat_context(document_id, question):
+    """
+    Document context for the chat model, or None when the document has no
+    translations. Uses the chunks most relevant to the question (both
+    languages, token-budgeted); documents uploaded before indexing existed
+    are indexed on their first chat.
+    """
+    translations = None
+    try:
+        document_context = retrieve_context(document_id, question)
+        if document_context is None:
+            # Check the database, not this worker's cache: the document may
+            # have been deleted by another worker, and indexing cached rows
+            # would put it back into the shared vector store
+            doc_meta = get_document_metadata(document_id, fresh=True)
+            if not doc_meta:
+                invalidate_document(document_id)
+                return None
+            translations = get_translations_for_document(document_id)
+            if not translations:
+                return None
+            index_translations(document_id, doc_meta.get("title"), translations)
+            document_context = retrieve_context(document_id, question)
+        if document_context:
+            print(f"[chat] Retrieved context length: {len(document_context)}")
+            return document_context
+    except Exception as e:
+        print(f"[chat] Retrieval failed, falling back to truncated context: {e}")
+
+    # Fallback: the start of the document in both languages
+    if translations is None:
+        translations = get_translations_for_document(document_id)
+    print(f"[chat] Translations count: {len(translations) if translations else 0}")
+    
+    if not translations:
+        return None
+
+    # Prepare document context for AI
+    context_parts = []
+    native_context = " ".join([t["original_text"] for t in translations if t["original_text"]])
+    translated_context = " ".join([t["translated_text"] for t in translations if t["translated_text"]])
+    
+    if native_context:
+        context_parts.append(f"Original text: {native_context[:2000]}")
+    if translated_context:
+        context_parts.append(f"English translation: {translated_context[:2000]}")
+    
+    document_context = "\n\n".join(context_parts)
+    
+    print(f"[chat] Generated context length: {len(document_context)}")
+    return document_context
+
+
+# Chat turns are written by one background thread, so Supabase round trips
+# never add to chat latency; explicit timestamps keep turns in order.
+_chat_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-writer")
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def save_chat_turn(document_id, user_id, message, assistant_reply, asked_at=None, answered_at=None):
+    """Persist the user message and assistant reply in one insert; failures are logged, not raised"""
+    try:
+        # Get or create chat for this user and document (cached after the first turn)
+        chat_id = get_or_create_chat(document_id, user_id)
+        if chat_id:
+            insert_messages(chat_id, [
+                {"role": "user", "content": message, "created_at": asked_at or _now_iso()},
+                {"role": "assistant", "content": assistant_reply, "created_at": answered_at or _now_iso()},
+            ])
+            print(f"[chat] Saved messages to Supabase for chat_id={chat_id}")
+        else:
+            print(f"[chat] Failed to create/get chat for user={user_id}, doc={document_id}")
+    except Exception as save_error:
+        print(f"[chat] Error saving messages: {save_error}")
+
+
+def persist_chat_turn(document_id, user_id, message, assistant_reply, asked_at):
+    """Queue save_chat_turn on the background writer and return immediately"""
+    _chat_writer.submit(save_chat_turn, document_id, user_id, message, assistant_reply, asked_at, _now_iso())
+
+
+def _parse_chat_request():
+    data = request.json or {}
+    return data.get("documentId"), data.get("userId"), data.get("message", "").strip()
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _stream_chat(document_id, user_id, message):
+    """
+    Server-Sent Events response for a chat turn: a `delta` event per token
+    chunk, then `done` with the full reply, which is saved once the stream ends.
+    """
+    asked_at = _now_iso()
+
+    def events():
+        # Flush headers + a first byte immediately so proxies start streaming
+        yield ": stream open\n\n"
+        try:
+            document_context = build_chat_context(document_id, message)
+            if document_context is None:
+                chunks = iter([NO_DOCUMENT_CONTENT_REPLY])
+            else:
+                chunks = stream_chat_response(message, document_context)
+            reply_parts = []
+            for chunk in chunks:
+                reply_parts.append(chunk)
+                yield _sse("delta", {"content": chunk})
+            assistant_reply = "".join(reply_parts)
+            yield _sse("done", {"reply": assistant_reply})
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield _sse("error", {"error": "Internal error processing chat", "details": str(e)})
+            return
+        print(f"[chat] Streamed response: {assistant_reply[:100]}...")
+        persist_chat_turn(document_id, user_id, message, assistant_reply, asked_at)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/chat", methods=["POST"])
 def chat():
-    data = request.json or {}
-    document_id = data.get("documentId")
-    user_id = data.get("userId")
-    message = data.get("message", "").strip()
+    document_id, user_id, message = _parse_chat_request()
     if not document_id or not user_id or not message:
         return jsonify({"error": "Missing required fields"}), 400
     if not sb_available():
         return jsonify({"error": "Supabase not configured"}), 500
+
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return _stream_chat(document_id, user_id, message)
     
     try:
         print(f"[chat] Received request: doc={document_id}, user={user_id}, msg={message}")
+        asked_at = _now_iso()
         
-        # Get document context from Supabase
-        translations = get_translations_for_document(document_id)
-        doc_meta = get_document_metadata(document_id)
-        
-        print(f"[chat] Document metadata: {doc_meta}")
-        print(f"[chat] Translations count: {len(translations) if translations else 0}")
-        
-        if not translations:
-            assistant_reply = "Sorry, I don't have access to the document content. Please make sure the document was processed successfully."
+        document_context = build_chat_context(document_id, message)
+        if document_context is None:
+            assistant_reply = NO_DOCUMENT_CONTENT_REPLY
         else:
-            # Prepare document context for AI
-            context_parts = []
-            native_context = " ".join([t["original_text"] for t in translations if t["original_text"]])
-            translated_context = " ".join([t["translated_text"] for t in translations if t["translated_text"]])
-            
-            if native_context:
-                context_parts.append(f"Original text: {native_context[:2000]}")
-            if translated_context:
-                context_parts.append(f"English translation: {translated_context[:2000]}")
-            
-            document_context = "\n\n".join(context_parts)
-            
-            print(f"[chat] Generated context length: {len(document_context)}")
-            
             # Generate intelligent response using OpenAI
             assistant_reply = generate_chat_response(message, document_context)
         
         print(f"[chat] Generated response: {assistant_reply[:100]}...")
         
-        # Save messages to Supabase
-        try:
-            # Get or create chat for this user and document
-            chat_id = get_or_create_chat(document_id, user_id)
-            if chat_id:
-                # Save user message
-                insert_message(chat_id, "user", message)
-                # Save assistant reply
-                insert_message(chat_id, "assistant", assistant_reply)
-                print(f"[chat] Saved messages to Supabase for chat_id={chat_id}")
-            else:
-                print(f"[chat] Failed to create/get chat for user={user_id}, doc={document_id}")
-        except Exception as save_error:
-            print(f"[chat] Error saving messages: {save_error}")
+        # Save messages to Supabase (in the background)
+        persist_chat_turn(document_id, user_id, message, assistant_reply, asked_at)
         
         return jsonify({"reply": assistant_reply})
     except Exception as e:
@@ -782,6 +778,18 @@ def chat():
         return jsonify({"error": "Internal error processing chat", "details": str(e)}), 500
 
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Same as /chat, streamed to the client over Server-Sent Events"""
+    document_id, user_id, message = _parse_chat_request()
+    if not document_id or not user_id or not message:
+        return jsonify({"error": "Missing required fields"}), 400
+    if not sb_available():
+        return jsonify({"error": "Supabase not configured"}), 500
+    print(f"[chat] Received stream request: doc={document_id}, user={user_id}, msg={message}")
+    return _stream_chat(document_id, user_id, message)
+
+
 @app.route("/user/documents", methods=["GET"])
 def get_user_documents_endpoint():
     """Get all documents for a specific user"""
@@ -875,33 +883,14 @@ def delete_user_document_endpoint(document_id):
         
         if not success:
             return jsonify({"error": "Failed to delete document or document not found"}), 404
-        
-        # Also delete the actual files from the filesystem
+
         try:
-            import os
-            import glob
-            
-            # Delete original uploaded file
-            upload_pattern = os.path.join(UPLOAD_DIR, f"{document_id}.*")
-            for file_path in glob.glob(upload_pattern):
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"[delete] Deleted uploaded file: {file_path}")
-            
-            # Delete generated PDF files
-            pdf_patterns = [
-                os.path.join(DATA_DIR, f"{document_id}_native.pdf"),
-                os.path.join(DATA_DIR, f"{document_id}_english.pdf"),
-            ]
-            
-            for pdf_path in pdf_patterns:
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-                    print(f"[delete] Deleted PDF file: {pdf_path}")
-                    
-        except Exception as file_error:
-            print(f"[delete] File deletion warning: {file_error}")
-            # Don't fail the request if file deletion fails
+            delete_document_embeddings(document_id)
+        except Exception as e:
+            print(f"[delete] Failed to remove document from vector store: {e}")
+        
+        # Uploaded file and every generated PDF are removed by the background reaper
+        reap_document_files(document_id, [UPLOAD_DIR, DATA_DIR])
         
         return jsonify({"success": True, "message": "Document deleted successfully"})
         
@@ -929,29 +918,15 @@ def download_translation_pdf(document_id):
         
         # Use identical logic to metadata endpoint
         translated_text = "\n\n".join(t["translated_text"] for t in translations if t["translated_text"])
-        
-        # Enhanced debug logging
-        print(f"[PDF Download] Document ID: {document_id}")
-        print(f"[PDF Download] Found {len(translations)} translation records")
-        print(f"[PDF Download] Translation records:")
-        for i, t in enumerate(translations):
-            print(f"  Record {i}: page={t.get('page_number', 'N/A')}, text_len={len(t.get('translated_text', ''))}")
-            print(f"    Text preview: {t.get('translated_text', '')[:100]}...")
-        print(f"[PDF Download] Combined text length: {len(translated_text)}")
-        print(f"[PDF Download] First 200 chars: {translated_text[:200]}")
-        
         if not translated_text.strip():
             return jsonify({"error": "No translated content available"}), 404
         
-        # Create PDF with translated text
-        pdf_filename = f"{document_id}_download.pdf"
-        pdf_path = os.path.join(DATA_DIR, pdf_filename)
-        text_to_pdf(translated_text, pdf_path, None)  # None for font_path uses default Arial
-        
-        if os.path.exists(pdf_path):
-            return send_file(pdf_path, as_attachment=True, download_name=f"translation_{document_id}.pdf")
-        else:
-            return jsonify({"error": "Failed to generate PDF"}), 500
+        # Rendered once per distinct translation text; repeat downloads are a file send,
+        # or a 304 when the client's If-None-Match still matches
+        digest, pdf_path = cached_download_pdf(document_id, translated_text)
+        print(f"[PDF Download] {document_id}: {len(translations)} pages, etag {digest[:16]}")
+        return send_file(pdf_path, as_attachment=True, download_name=f"translation_{document_id}.pdf",
+                         etag=digest, last_modified=os.path.getmtime(pdf_path), conditional=True)
             
     except Exception as e:
         print(f"Error downloading PDF: {e}")
@@ -988,5 +963,29 @@ def debug_translations(document_id):
         return jsonify({"error": "Debug failed"}), 500
 
 
+@app.route('/debug/translation-cache', methods=['GET', 'DELETE'])
+def debug_translation_cache():
+    """Translation cache hit/miss stats; DELETE clears it (?stale=1: only entries from older prompts)"""
+    try:
+        if request.method == 'DELETE':
+            if request.args.get("stale") == "1":
+                removed = purge_stale_translations()
+            else:
+                removed = translation_cache.purge()
+            return jsonify({"success": True, "removed": removed})
+        return jsonify(translation_cache.stats())
+    except Exception as e:
+        print(f"Translation cache error: {e}")
+        return jsonify({"error": "Translation cache unavailable"}), 500
+
+
+@app.route('/debug/document-cache', methods=['GET', 'DELETE'])
+def debug_document_cache():
+    """Hit/miss stats of this process's document metadata/translations cache; DELETE clears it"""
+    if request.method == 'DELETE':
+        return jsonify({"success": True, "removed": document_cache.purge()})
+    return jsonify(document_cache.stats())
+
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,47 @@
+# artifacts.py - per-document manifest of the files served by /file/<id>
+import os
+import json
+import uuid
+import mimetypes
+
+
+def manifest_path(directory, document_id):
+    return os.path.join(directory, f"{document_id}.manifest.json")
+
+
+def write_manifest(directory, document_id, artifacts):
+    """
+    Record the file behind each view of a document ("native", "english") so
+    /file/<id> is one manifest read instead of probing for every variant.
+    Views whose file was not produced are left out.
+    """
+    entries = {}
+    for view, path in artifacts.items():
+        if not path or not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        entries[view] = {
+            "path": path,
+            "mimetype": mimetypes.guess_type(path)[0] or "application/octet-stream",
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+
+    path = manifest_path(directory, document_id)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"document_id": document_id, "artifacts": entries}, f)
+    os.replace(tmp_path, path)
+    return entries
+
+
+def read_manifest(directory, document_id):
+    """The document's artifacts by view, or None when no manifest was written."""
+    try:
+        with open(manifest_path(directory, document_id), "r") as f:
+            return json.load(f).get("artifacts", {})
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[artifacts] Unreadable manifest for {document_id}: {e}")
+        return None
@@ -0,0 +1,72 @@
+# audio.py - Whisper transcription with a process-wide model registry
+import os
+import ssl
+import threading
+import whisper
+
+# Model size used for uploads (base is a good balance of speed/accuracy)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+
+# Map Whisper language codes to our language names
+LANGUAGE_NAMES = {
+    "si": "sinhala",  # Sinhala
+    "ne": "nepali",   # Nepali
+    "en": "english",  # English
+    "hi": "nepali",   # Hindi (treat as Nepali for our purposes)
+}
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_whisper_model(size=None):
+    """
+    Return the Whisper model for `size`, loading it on first use. Each size
+    is loaded at most once per process and shared by every later call.
+    """
+    size = size or WHISPER_MODEL
+    model = _models.get(size)
+    if model is not None:
+        return model
+    with _models_lock:
+        if size not in _models:
+            # Handle SSL certificate issues when downloading model weights
+            ssl._create_default_https_context = ssl._create_unverified_context
+            print(f"[audio] Loading Whisper model '{size}'")
+            _models[size] = whisper.load_model(size)
+        return _models[size]
+
+
+def warm_up(size=None):
+    """Load the Whisper model ahead of the first audio upload (worker start)."""
+    try:
+        get_whisper_model(size)
+    except Exception as e:
+        print(f"[audio] Whisper warm-up failed: {e}")
+
+
+def transcribe_audio(file_path, size=None):
+    """
+    Transcribe audio file with a single Whisper pass.
+    Returns ({"text", "language", "language_code", "segments"}, None) or
+    (None, error message).
+    """
+    try:
+        result = get_whisper_model(size).transcribe(file_path)
+    except Exception as e:
+        return None, f"Error transcribing audio: {str(e)}"
+
+    text = (result.get("text") or "").strip()
+    if not text:
+        return None, "No speech detected in audio file"
+
+    language_code = result.get("language", "unknown")
+    return {
+        "text": text,
+        "language": LANGUAGE_NAMES.get(language_code, "unknown"),
+        "language_code": language_code,
+        "segments": [
+            {"start": seg["start"], "end": seg["end"], "text": seg["text"].strip()}
+            for seg in result.get("segments", [])
+        ],
+    }, None
@@ -0,0 +1,330 @@
+# benchmarks/bench_normalizer.py - normalizer.normalize_ocr_text vs. the old clean_ocr_text
+#
+# Usage (from backend/):
+#   python benchmarks/bench_normalizer.py [--repeat 20]
+#   python benchmarks/bench_normalizer.py --build [--ocr]    # regenerate normalizer_corpus.json
+#
+# First checks that normalize_ocr_text reproduces the expected output of every
+# case in normalizer_corpus.json (exit status 1 on any difference), then times
+# both implementations over the corpus for each target language.
+# The corpus is built with the old implementation from the text layer of the
+# translated sample PDFs in ./data, native-script seed lines with typical OCR
+# noise, and seeded random mixes of both; --ocr adds the raw tesseract output
+# of every candidate pass over the first sample pages (needs tesseract).
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import zlib
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalizer import normalize_ocr_text  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalizer_corpus.json")
+TARGETS = ["nep", "nepali", "sin", "sinhala", "eng"]
+FUZZ_CASES = 200
+
+
+# --- The previous implementation, kept verbatim as the reference ------------
+
+def _legacy_remove_repeated_characters(text):
+    """
+    Remove lines with excessive character repetition (OCR artifacts)
+    """
+    lines = text.split('\n')
+    cleaned_lines = []
+    
+    for line in lines:
+        # Skip lines with excessive repetition (more than 3 consecutive same characters)
+        if re.search(r'(.)\1{3,}', line):
+            continue
+        
+        # Skip lines that are mostly the same character (more than 60% same character)
+        if len(line.strip()) > 5:
+            char_counts = {}
+            for char in line.strip():
+                char_counts[char] = char_counts.get(char, 0) + 1
+            
+            max_count = max(char_counts.values())
+            if max_count / len(line.strip()) > 0.6:
+                continue
+        
+        # Skip lines with common OCR noise patterns
+        if re.search(r'\b(jey|ve|je|ye|ey)\b', line.lower()):
+            continue
+        
+        cleaned_lines.append(line)
+    
+    return '\n'.join(cleaned_lines)
+
+
+def _legacy_clean_ocr_text(text, target_lang="nep"):
+    """
+    Clean OCR output by removing unwanted characters and artifacts
+    """
+    
+    # First remove repeated character patterns
+    text = _legacy_remove_repeated_characters(text)
+    
+    # Remove common OCR artifacts but preserve more characters
+    text = re.sub(r'[^\w\s\u0900-\u097F\u0D80-\u0DFF\n।॥.,!?;:()]', '', text)  # Keep punctuation and more characters
+    
+    # Remove standalone English words that are likely OCR errors
+    if target_lang in ["nep", "nepali"]:
+        # Split into lines and clean each line
+        lines = text.split('\n')
+        cleaned_lines = []
+        
+        for line in lines:
+            # If line contains mostly English words (excluding Devanagari), be more conservative
+            devanagari_chars = re.findall(r'[\u0900-\u097F]', line)
+            if len(devanagari_chars) == 0:
+                # Only skip very short English-only lines that are likely noise
+                if len(line.strip().split()) <= 1:  # Only skip single word lines
+                    continue
+            
+            # Remove standalone English words that are likely OCR errors
+            words = line.split()
+            filtered_words = []
+            for word in words:
+                devanagari_in_word = re.findall(r'[\u0900-\u097F]', word)
+                english_in_word = re.findall(r'[a-zA-Z]', word)
+                
+                # Skip standalone English words that are likely OCR errors
+                if not devanagari_in_word and english_in_word:
+                    # Skip common OCR noise words (including variations)
+                    noise_words = [
+                        'jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be',
+                        'jeyy', 'jeyyy', 'jeyyyy', 'jeyyyyy',  # Repeated jey variations
+                        'vey', 'veyy', 'veyyy',  # Vey variations
+                        'jey', 'jeyjey', 'jeyjeyjey',  # Jey repetitions
+                        'je', 'jeje', 'jejeje',  # Je repetitions
+                        'ye', 'yeye', 'yeyeye',  # Ye repetitions
+                        'ey', 'eyey', 'eyeyey',  # Ey repetitions
+                        'y', 'yy', 'yyy', 'yyyy', 'yyyyy',  # Y repetitions
+                        'e', 'ee', 'eee', 'eeee', 'eeeee',  # E repetitions
+                        'j', 'jj', 'jjj', 'jjjj', 'jjjjj',  # J repetitions
+                        'v', 'vv', 'vvv', 'vvvv', 'vvvvv',  # V repetitions
+                    ]
+                    if word.lower() in noise_words:
+                        continue
+                    # Skip short English-only words (likely OCR errors)
+                    if len(word) <= 3:
+                        continue
+                    # Skip words with excessive character repetition
+                    if re.search(r'(.)\1{2,}', word.lower()):  # 3+ consecutive same characters
+                        continue
+                
+                filtered_words.append(word)
+            
+            cleaned_line = ' '.join(filtered_words)
+            if cleaned_line.strip():
+                cleaned_lines.append(cleaned_line)
+        
+        return '\n'.join(cleaned_lines)
+    
+    elif target_lang in ["sin", "sinhala"]:
+        # Sinhala-specific cleaning
+        lines = text.split('\n')
+        cleaned_lines = []
+        
+        for line in lines:
+            # If line contains mostly English words (excluding Sinhala), skip simple English words
+            sinhala_chars = re.findall(r'[\u0D80-\u0DFF]', line)
+            if len(sinhala_chars) == 0:
+                # If no Sinhala characters, this might be OCR noise
+                if len(line.strip().split()) <= 2:  # Skip short English-only lines
+                    continue
+            
+            # Remove standalone English words that are likely OCR errors
+            words = line.split()
+            filtered_words = []
+            for word in words:
+                sinhala_in_word = re.findall(r'[\u0D80-\u0DFF]', word)
+                english_in_word = re.findall(r'[a-zA-Z]', word)
+                
+                # Skip standalone English words that are likely OCR errors
+                if not sinhala_in_word and english_in_word:
+                    # Skip common OCR noise words
+                    noise_words = ['jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be']
+                    if word.lower() in noise_words:
+                        continue
+                    # Skip short English-only words (likely OCR errors)
+                    if len(word) <= 3:
+                        continue
+                
+                filtered_words.append(word)
+            
+            cleaned_line = ' '.join(filtered_words)
+            if cleaned_line.strip():
+                cleaned_lines.append(cleaned_line)
+        
+        return '\n'.join(cleaned_lines)
+    
+    return text
+
+
+# --- Corpus ------------------------------------------------------------------
+
+NATIVE_SEED_LINES = [
+    "बादलमा बिजुली चम्कियो, आकाशमा बिहे भयो ।",
+    "असारको शुभ साइतमा ग्रह मिलेको छ ॥",
+    "बाँसको आवाजले बेंसी गुञ्जिरहेछ,",
+    "दुलहीलाई हरियो पछ्यौरा ओढाइयो।",
+    "मयूरको बोली गीत बनेको छ",
+    "वन नै मण्डप बनेझैं झुमिरहेछ!",
+    "१२३ पृष्ठ — नेपाली कविता (भाग २)",
+    "ॐ ॥ । ।। क्ष त्र ज्ञ",
+    "इ ई उ ऊ ऋ ए ऐ ओ औ",
+    "වලාකුළු අතර විදුලිය දිලිසෙයි.",
+    "අහසේ මංගල්‍යය සිදු විය",
+    "ශ්‍රී ලංකාව, කොළඹ 07",
+    "කවිය ලියූ තැනැත්තා?",
+]
+
+NOISE_LINES = [
+    "jey jey jey", "ve je ye", "Jeyyy VEYY yy", "|||| ____", "======", "IIIIIII", "l l l l l l",
+    "a a a a a a a", "e.g. the and or is be", "AAA bbb cccc", "— “quoted” ‘x’ © ® ™ • · …",
+    "\t\tindented\ttext", "trailing spaces   ", "four    spaces", "\x0cform feed", "windows\r",
+    "nbsp here", "नेपालabc abcनेपाल", "mixed नेपाल the word and wordsss", "_under_score_ x_y",
+    "12345 6789", "Straße İstanbul ǅ ﬁne", "Ⅻ x² ½", "emoji 😀 text", "zero​width ශ්‍රී",
+    "", " ", "ye", "eyey", "कखग jjj vvvv", "සිංහල ve", "Hello World Again", "Word", "Two words",
+]
+
+
+def _pdf_text_lines(path):
+    """Strings drawn with Tj in a generated (fpdf) translation PDF."""
+    with open(path, "rb") as f:
+        data = f.read()
+    lines = []
+    for stream in re.findall(rb"stream\r?\n(.*?)endstream", data, re.S):
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        for m in re.finditer(rb"\(((?:\\.|[^\\)])*)\) Tj", stream):
+            lines.append(re.sub(rb"\\(.)", rb"\1", m.group(1)).decode("latin-1").rstrip())
+    return lines
+
+
+def _fuzz_texts(english_words, rng):
+    native_words = [w for line in NATIVE_SEED_LINES for w in line.split()]
+    noise_words = [w for line in NOISE_LINES for w in line.split()]
+    alphabet = "aeyjvIl|_=.-,!?()।॥कखनेප්‍ර0१ \t"
+    separators = [" ", " ", " ", "  ", "\t", "    ", " ", ""]
+
+    def token():
+        kind = rng.random()
+        if kind < 0.4:
+            return rng.choice(native_words)
+        if kind < 0.65:
+            return rng.choice(english_words or noise_words)
+        if kind < 0.85:
+            return rng.choice(noise_words)
+        return rng.choice(alphabet) * rng.randint(1, 6)
+
+    texts = []
+    for _ in range(FUZZ_CASES):
+        lines = []
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.1:
+                lines.append("")
+                continue
+            parts = [token() for _ in range(rng.randint(1, 10))]
+            lines.append("".join(p + rng.choice(separators) for p in parts))
+        texts.append("\n".join(lines))
+    return texts
+
+
+def _ocr_texts(data_dir, max_pages):
+    from ocr import _candidate_langs, iter_pdf_pages, pdf_page_count, preprocess_image
+    from ocr_engines import get_engine
+    from bench_ocr_workers import _sample_pdfs
+
+    engine = get_engine()
+    texts = []
+    for pdf in _sample_pdfs(data_dir):
+        for image in iter_pdf_pages(pdf, page_count=min(pdf_page_count(pdf), max_pages)):
+            with engine.page(preprocess_image(image)) as page:
+                for langs in _candidate_langs("nep"):
+                    for cfg in ("--oem 3 --psm 6", "--oem 3 --psm 7"):
+                        texts.append(engine.image_to_string(page, lang=langs, config=cfg))
+    return texts
+
+
+def build_corpus(data_dir, ocr=False, max_pages=2):
+    english_lines = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_english.pdf")) +
+                       glob.glob(os.path.join(data_dir, "*_download.pdf"))):
+        english_lines.append(_pdf_text_lines(path))
+    texts = ["\n".join(lines) for lines in english_lines]
+    texts += NATIVE_SEED_LINES + NOISE_LINES
+    texts.append("\n".join(NATIVE_SEED_LINES + NOISE_LINES))
+    texts += _fuzz_texts([w for lines in english_lines for line in lines for w in line.split()], random.Random(0))
+    if ocr:
+        texts += _ocr_texts(data_dir, max_pages)
+    return [{"text": text, "expected": {target: _legacy_clean_ocr_text(text, target_lang=target)
+                                        for target in TARGETS}}
+            for text in texts]
+
+
+# --- Check + benchmark ---------------------------------------------------------
+
+def check(corpus):
+    failures = 0
+    for i, case in enumerate(corpus):
+        for target, expected in case["expected"].items():
+            if normalize_ocr_text(case["text"], target_lang=target) != expected:
+                failures += 1
+                print(f"MISMATCH case {i} target={target}: {case['text'][:60]!r}")
+    return failures
+
+
+def _timed(fn, texts, target, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text, target_lang=target)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--build", action="store_true", help="regenerate the corpus with the old implementation")
+    parser.add_argument("--ocr", action="store_true", help="with --build, add raw tesseract output of sample pages")
+    parser.add_argument("--max-pages", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.build:
+        corpus = build_corpus(args.data_dir, ocr=args.ocr, max_pages=args.max_pages)
+        with open(CORPUS_PATH, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=1)
+        print(f"Wrote {len(corpus)} cases to {CORPUS_PATH}")
+
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    failures = check(corpus)
+    print(f"{len(corpus)} cases x {len(TARGETS)} targets: {failures} mismatches")
+
+    texts = [case["text"] for case in corpus]
+    chars = sum(len(t) for t in texts)
+    print(f"\n{'target':>8} {'old ms':>9} {'new ms':>9} {'speedup':>8}   ({len(texts)} texts, {chars} chars per run)")
+    for target in TARGETS:
+        old = _timed(_legacy_clean_ocr_text, texts, target, args.repeat)
+        new = _timed(normalize_ocr_text, texts, target, args.repeat)
+        print(f"{target:>8} {old * 1000:>9.2f} {new * 1000:>9.2f} {old / new:>7.1f}x")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_ocr_engines.py - per-page OCR latency: pytesseract (subprocess) vs. tesserocr (in-process)
+#
+# Usage (from backend/):
+#   python benchmarks/bench_ocr_engines.py [--engines pytesseract,tesserocr] [--lang nep] [--max-pages 4]
+#
+# OCRs the first pages of the sample PDFs in ./data with extract_text_from_image
+# in one process, as a single OCR worker would. The first page of each engine
+# includes its model loads (tesserocr initializes its APIs there), so "first"
+# and "rest" are reported separately. "similarity" is the difflib ratio of each
+# engine's text against the first engine's.
+import os
+import sys
+import time
+import difflib
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import extract_text_from_image, iter_pdf_pages, pdf_page_count  # noqa: E402
+from ocr_engines import get_engine  # noqa: E402
+from bench_ocr_workers import _sample_pdfs  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--engines", default="pytesseract,tesserocr")
+    parser.add_argument("--lang", default="nep")
+    parser.add_argument("--mode", default=None, choices=["confidence", "exhaustive"])
+    parser.add_argument("--max-pages", type=int, default=4)
+    args = parser.parse_args()
+
+    engines = []
+    for name in args.engines.split(","):
+        if get_engine(name).name != name:
+            print(f"{name}: not available, skipped")
+            continue
+        engines.append(name)
+
+    pages = []
+    for pdf in _sample_pdfs(args.data_dir):
+        page_count = min(pdf_page_count(pdf), args.max_pages)
+        pages.extend(iter_pdf_pages(pdf, page_count=page_count))
+    if not pages or not engines:
+        print("Nothing to benchmark")
+        return
+    print(f"{len(pages)} pages, lang={args.lang}, mode={args.mode or 'default'}")
+
+    texts = {}
+    print(f"{'engine':>12} {'first s':>8} {'rest median s':>14} {'rest mean s':>12} {'total s':>8} {'similarity':>11}")
+    for name in engines:
+        times = []
+        texts[name] = []
+        for image in pages:
+            start = time.perf_counter()
+            texts[name].append(extract_text_from_image(image, lang=args.lang, mode=args.mode, engine=name))
+            times.append(time.perf_counter() - start)
+        rest = times[1:] or times
+        reference = texts[engines[0]]
+        similarity = statistics.mean(difflib.SequenceMatcher(None, a, b).ratio()
+                                     for a, b in zip(reference, texts[name]))
+        print(f"{name:>12} {times[0]:>8.2f} {statistics.median(rest):>14.2f} {statistics.mean(rest):>12.2f} "
+              f"{sum(times):>8.1f} {similarity:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
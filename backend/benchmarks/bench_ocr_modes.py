@@ -0,0 +1,53 @@
+# benchmarks/bench_ocr_modes.py - speed/agreement of the "confidence" vs. "exhaustive" OCR modes
+#
+# Usage (from backend/):
+#   python benchmarks/bench_ocr_modes.py [--lang nep] [--max-pages 4]
+#
+# The exhaustive sweep is treated as the reference; "similarity" is the
+# difflib ratio of the confidence-mode text against it.
+import os
+import sys
+import time
+import difflib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr import extract_text_from_image, iter_pdf_pages, pdf_page_count  # noqa: E402
+from bench_ocr_workers import _sample_pdfs  # noqa: E402
+
+
+def _timed(image, lang, mode):
+    start = time.perf_counter()
+    text = extract_text_from_image(image, lang=lang, mode=mode)
+    return text, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--lang", default="nep")
+    parser.add_argument("--max-pages", type=int, default=4)
+    args = parser.parse_args()
+
+    totals = {"confidence": 0.0, "exhaustive": 0.0}
+    for pdf in _sample_pdfs(args.data_dir):
+        page_count = min(pdf_page_count(pdf), args.max_pages)
+        print(f"\n{os.path.basename(pdf)}: {page_count} pages, lang={args.lang}")
+        print(f"{'page':>5} {'exhaustive s':>13} {'confidence s':>13} {'chars ex/conf':>14} {'similarity':>11}")
+        for page_number, image in enumerate(iter_pdf_pages(pdf, page_count=page_count), start=1):
+            ref_text, ref_s = _timed(image, args.lang, "exhaustive")
+            text, s = _timed(image, args.lang, "confidence")
+            totals["exhaustive"] += ref_s
+            totals["confidence"] += s
+            similarity = difflib.SequenceMatcher(None, ref_text, text).ratio()
+            chars = f"{len(ref_text)}/{len(text)}"
+            print(f"{page_number:>5} {ref_s:>13.2f} {s:>13.2f} {chars:>14} {similarity:>11.3f}")
+
+    if totals["confidence"]:
+        print(f"\nTotal: exhaustive {totals['exhaustive']:.1f}s, confidence {totals['confidence']:.1f}s "
+              f"({totals['exhaustive'] / totals['confidence']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_ocr_workers.py - PDF OCR throughput (pages/sec) vs. OCR worker count
+#
+# Usage (from backend/):
+#   python benchmarks/bench_ocr_workers.py [--workers 1,2,4] [--lang nep] [--max-pages 8]
+#
+# Runs the real tesseract pipeline (ocr.ocr_pages) on the sample PDFs in ./data.
+# Identical samples are only benchmarked once.
+import os
+import sys
+import time
+import glob
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf2image import convert_from_path  # noqa: E402
+from ocr import ocr_pages  # noqa: E402
+
+
+def _sample_pdfs(data_dir):
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_original.pdf"))):
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})))
+    parser.add_argument("--lang", default="nep")
+    parser.add_argument("--max-pages", type=int, default=8)
+    args = parser.parse_args()
+
+    worker_counts = [int(n) for n in args.workers.split(",")]
+    for pdf in _sample_pdfs(args.data_dir):
+        images = convert_from_path(pdf, dpi=300, last_page=args.max_pages)
+        print(f"\n{os.path.basename(pdf)}: {len(images)} pages, lang={args.lang}")
+        print(f"{'workers':>8} {'seconds':>9} {'pages/sec':>10} {'speedup':>8}")
+        baseline = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            results = list(ocr_pages(images, lang=args.lang, workers=workers))
+            elapsed = time.perf_counter() - start
+            assert [n for n, _ in results] == list(range(1, len(images) + 1))
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {len(images) / elapsed:>10.2f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
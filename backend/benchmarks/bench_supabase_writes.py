@@ -0,0 +1,69 @@
+# benchmarks/bench_supabase_writes.py - upload persistence: per-page inserts vs. insert_translations_bulk
+#
+# Usage (from backend/):
+#   python benchmarks/bench_supabase_writes.py [--pages 20,200] [--latency 0.03] [--fail-every 0]
+#
+# Runs against benchmarks/fake_supabase.py with a fixed per-request latency
+# (a typical round trip to a hosted Supabase project), so the numbers are the
+# time an upload spends in the "saving" stage before its job completes.
+import os
+import sys
+import time
+import uuid
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_supabase import start_fake_supabase  # noqa: E402
+
+
+def _pages(count):
+    return [{"original_text": f"मूल पाठ {i} " * 200, "translated_text": f"translated text {i} " * 150, "page_number": i}
+            for i in range(1, count + 1)]
+
+
+def _document(count):
+    return {"user_id": "bench-user", "title": "bench.pdf", "file_url": "bench_original.pdf",
+            "language": "nepali", "page_count": count}
+
+
+def per_page(sc, doc_id, pages):
+    # The write path before insert_translations_bulk
+    sc.insert_document(document_id=doc_id, **_document(len(pages)))
+    for page in pages:
+        sc.insert_translation(document_id=doc_id, **page)
+
+
+def bulk(sc, doc_id, pages):
+    sc.insert_translations_bulk(doc_id, pages, document=_document(len(pages)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default="20,200")
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per Supabase request")
+    parser.add_argument("--fail-every", type=int, default=0, help="fail every Nth write with a 503")
+    args = parser.parse_args()
+
+    server, url = start_fake_supabase(latency=args.latency, fail_every=args.fail_every)
+    os.environ["SUPABASE_URL"] = url
+    os.environ["SUPABASE_KEY"] = "fake.fake.fake"
+    import supabase_client as sc  # noqa: E402 - connects at import
+
+    print(f"latency={args.latency * 1000:.0f}ms/request fail_every={args.fail_every}")
+    print(f"{'pages':>6} {'method':>9} {'seconds':>9} {'requests':>9} {'rows stored':>12}")
+    for count in (int(p) for p in args.pages.split(",")):
+        pages = _pages(count)
+        for name, write in (("per-page", per_page), ("bulk", bulk)):
+            doc_id = str(uuid.uuid4())
+            before = server.request_count
+            start = time.perf_counter()
+            write(sc, doc_id, pages)
+            elapsed = time.perf_counter() - start
+            stored = sum(1 for r in server.tables.get("translations", []) if r["document_id"] == doc_id)
+            print(f"{count:>6} {name:>9} {elapsed:>9.2f} {server.request_count - before:>9} {stored:>12}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
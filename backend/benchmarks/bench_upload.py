@@ -0,0 +1,275 @@
+# benchmarks/bench_upload.py - end-to-end upload pipeline timings with local OpenAI/Supabase fakes
+#
+# Usage (from backend/):
+#   python benchmarks/bench_upload.py [--openai-latency 0.5] [--supabase-latency 0.03] [--max-pages 4]
+#                                     [--ocr-workers 1] [--repeat 1] [--compare benchmarks/results/<old>.json]
+#
+# Runs the real upload pipeline (app.process_upload: OCR, PDF rendering,
+# Whisper for audio) on the bundled samples in ./data and ./tmp_uploads,
+# deduplicated by content, with benchmarks/fake_openai.py and
+# benchmarks/fake_supabase.py standing in for the network services. Each
+# upload runs in a scratch working directory, so ./data is not touched and
+# the translation/embedding caches start cold.
+#
+# Stage times are exclusive (a stage's time excludes the stages it calls):
+#   rasterize  pdf2image page rendering pulled by the OCR loop
+#   detect     language detection pass (includes rasterizing page 1)
+#   ocr        tesseract passes, minus clean
+#   clean      OCR text normalization (only visible with --ocr-workers 1,
+#              otherwise it runs inside the OCR worker processes and is part of ocr)
+#   transcribe Whisper, for audio samples
+#   translate  OpenAI chat completions
+#   index      chunk embedding + vector store writes
+#   persist    Supabase writes
+#   render     text_to_pdf
+#   other      everything else in process_upload
+# Results are written to benchmarks/results/<time>-<commit>.json; --compare
+# prints the per-stage change against an earlier results file.
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+from fake_openai import start_fake_openai  # noqa: E402
+from fake_supabase import start_fake_supabase  # noqa: E402
+
+STAGES = ["rasterize", "detect", "ocr", "clean", "transcribe", "translate", "index", "persist", "render", "other"]
+SAMPLE_EXTENSIONS = ("pdf", "png", "jpg", "jpeg", "mp3", "wav", "m4a", "flac", "ogg")
+FONT_FILE = "NotoSansDevanagari-Regular.ttf"
+
+
+class StageTimer:
+    """Exclusive wall time per stage; nested stages are subtracted from their caller."""
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []
+
+    def reset(self):
+        self.totals = {}
+        self._stack = []
+
+    def __call__(self, stage, fn, *args, **kwargs):
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            self.totals[stage] = self.totals.get(stage, 0.0) + elapsed - children
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            return self(stage, fn, *args, **kwargs)
+        return timed
+
+    def wrap_generator(self, stage, fn):
+        # Time spent producing each item, not the time the consumer holds it
+        def timed(*args, **kwargs):
+            iterator = self(stage, iter, fn(*args, **kwargs))
+            while True:
+                try:
+                    yield self(stage, next, iterator)
+                except StopIteration:
+                    return
+        return timed
+
+
+def _samples(max_samples):
+    seen = set()
+    samples = []
+    paths = sorted(glob.glob(os.path.join(BACKEND_DIR, "data", "*_original.pdf")))
+    paths += sorted(p for p in glob.glob(os.path.join(BACKEND_DIR, "tmp_uploads", "*"))
+                    if p.rsplit(".", 1)[-1].lower() in SAMPLE_EXTENSIONS)
+    for path in paths:
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        samples.append(path)
+    return samples[:max_samples] if max_samples else samples
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=BACKEND_DIR, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def _instrument(app, ocr, timer, max_pages):
+    """Wrap the pipeline's calls (as process_upload and ocr.py look them up) with stage timers."""
+    if max_pages:
+        page_count = app.pdf_page_count
+        app.pdf_page_count = lambda path: min(page_count(path), max_pages)
+    app.iter_pdf_pages = timer.wrap_generator("rasterize", app.iter_pdf_pages)
+    app.detect_document_language = timer.wrap("detect", app.detect_document_language)
+    app.ocr_pages = timer.wrap_generator("ocr", app.ocr_pages)
+    app.extract_text_from_image = timer.wrap("ocr", app.extract_text_from_image)
+    ocr.clean_ocr_text = timer.wrap("clean", ocr.clean_ocr_text)
+    app.transcribe_audio = timer.wrap("transcribe", app.transcribe_audio)
+    app.translate_pages = timer.wrap("translate", app.translate_pages)
+    app.translate_text_to_english = timer.wrap("translate", app.translate_text_to_english)
+    app.index_document = timer.wrap("index", app.index_document)
+    app.insert_translations_bulk = timer.wrap("persist", app.insert_translations_bulk)
+    app.text_to_pdf = timer.wrap("render", app.text_to_pdf)
+
+
+def run_sample(app, timer, path, openai_server, supabase_server):
+    doc_id = f"bench-{hashlib.sha1(os.urandom(8)).hexdigest()[:12]}"
+    ext = path.rsplit(".", 1)[-1].lower()
+    filename = f"sample.{ext}"
+    file_path = os.path.join(app.UPLOAD_DIR, f"{doc_id}.{ext}")
+    shutil.copy(path, file_path)  # what /upload does with the request body
+
+    timer.reset()
+    openai_before, supabase_before = openai_server.request_count, supabase_server.request_count
+    start = time.perf_counter()
+    result = timer("other", app.process_upload, doc_id, file_path, filename, "bench-user")
+    total = time.perf_counter() - start
+    return {
+        "total_s": total,
+        "pages": result["numPages"],
+        "stages": {stage: timer.totals.get(stage, 0.0) for stage in STAGES},
+        "openai_requests": openai_server.request_count - openai_before,
+        "supabase_requests": supabase_server.request_count - supabase_before,
+    }
+
+
+def _median_run(runs):
+    return {
+        "total_s": statistics.median(r["total_s"] for r in runs),
+        "pages": runs[0]["pages"],
+        "stages": {stage: statistics.median(r["stages"][stage] for r in runs) for stage in STAGES},
+        "openai_requests": runs[0]["openai_requests"],
+        "supabase_requests": runs[0]["supabase_requests"],
+    }
+
+
+def _print_table(samples):
+    print(f"\n{'sample':<28} {'pages':>5} {'total s':>8} " + " ".join(f"{s:>10}" for s in STAGES))
+    for sample in samples:
+        print(f"{sample['file'][:28]:<28} {sample['pages']:>5} {sample['total_s']:>8.2f} "
+              + " ".join(f"{sample['stages'][s]:>10.2f}" for s in STAGES))
+
+
+def _print_comparison(results, baseline_path):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    before = {s["file"]: s for s in baseline["samples"]}
+    print(f"\nvs. {os.path.basename(baseline_path)} (commit {baseline['commit']}): change in seconds (and %)")
+    print(f"{'sample':<28} {'total':>16} " + " ".join(f"{s:>16}" for s in STAGES))
+    for sample in results["samples"]:
+        old = before.get(sample["file"])
+        if old is None or "error" in old:
+            continue
+
+        def delta(new_s, old_s):
+            pct = f"{(new_s - old_s) / old_s * 100:+.0f}%" if old_s > 0.005 else "-"
+            return f"{new_s - old_s:+.2f} ({pct})"
+
+        print(f"{sample['file'][:28]:<28} {delta(sample['total_s'], old['total_s']):>16} "
+              + " ".join(f"{delta(sample['stages'][s], old['stages'].get(s, 0.0)):>16}" for s in STAGES))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds per OpenAI request")
+    parser.add_argument("--supabase-latency", type=float, default=0.03, help="seconds per Supabase request")
+    parser.add_argument("--max-pages", type=int, default=4, help="OCR at most this many pages per PDF (0 = all)")
+    parser.add_argument("--max-samples", type=int, default=0)
+    parser.add_argument("--ocr-workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per sample; the median is reported")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    openai_server, openai_url = start_fake_openai(latency=args.openai_latency)
+    supabase_server, supabase_url = start_fake_supabase(latency=args.supabase_latency)
+    workdir = tempfile.mkdtemp(prefix="bench_upload_")
+    os.environ.update({
+        "OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": openai_url,
+        "SUPABASE_URL": supabase_url, "SUPABASE_KEY": "fake.fake.fake",
+        "DATA_DIR": os.path.join(workdir, "data"), "OCR_WORKERS": str(args.ocr_workers),
+        "TRANSLATION_CACHE": "0", "EMBEDDING_CACHE": "0", "WHISPER_PRELOAD": "0",
+    })
+    samples = _samples(args.max_samples)
+    # app.py resolves tmp_uploads/, data/ and the Devanagari font against the working directory
+    os.chdir(workdir)
+    os.symlink(os.path.join(BACKEND_DIR, FONT_FILE), FONT_FILE)
+    import app  # noqa: E402 - reads the environment above at import
+    import ocr  # noqa: E402
+
+    timer = StageTimer()
+    _instrument(app, ocr, timer, args.max_pages)
+
+    commit, dirty = _git_commit()
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: getattr(args, k) for k in ("openai_latency", "supabase_latency", "max_pages",
+                                                   "ocr_workers", "repeat")},
+        "samples": [],
+    }
+    print(f"commit {commit}{' (dirty)' if dirty else ''}, {len(samples)} samples, "
+          f"openai {args.openai_latency * 1000:.0f}ms, supabase {args.supabase_latency * 1000:.0f}ms, "
+          f"ocr workers {args.ocr_workers}")
+    try:
+        for path in samples:
+            name = os.path.relpath(path, BACKEND_DIR)
+            try:
+                runs = [run_sample(app, timer, path, openai_server, supabase_server) for _ in range(args.repeat)]
+            except Exception as e:
+                print(f"[bench] {name} failed: {e}")
+                results["samples"].append({"file": name, "error": str(e)})
+                continue
+            results["samples"].append({"file": name, **_median_run(runs)})
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = [s for s in results["samples"] if "error" not in s]
+    results["totals"] = {
+        "total_s": sum(s["total_s"] for s in completed),
+        "pages": sum(s["pages"] for s in completed),
+        "stages": {stage: sum(s["stages"][stage] for s in completed) for stage in STAGES},
+    }
+    _print_table(completed + [{"file": "TOTAL", **results["totals"]}])
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        _print_comparison({"samples": completed}, args.compare)
+
+
+if __name__ == "__main__":
+    main()
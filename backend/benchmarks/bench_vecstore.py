@@ -0,0 +1,184 @@
+# benchmarks/bench_vecstore.py - memory-mapped vector store vs. the old vecstore.json store
+#
+# Usage (from backend/):
+#   python benchmarks/bench_vecstore.py [--sizes 10000,1000000] [--dim 1536] [--dtype float32]
+#
+# Builds a synthetic store of N chunks (CHUNKS_PER_DOC per document) in a temp
+# dir and times the chat path: a top-k query filtered to one document, an
+# unfiltered query, and re-indexing one document (an append to the segment
+# log; compaction is timed separately). The JSON store is only
+# built up to --legacy-max chunks: at 1M x 1536 it would be tens of GB of JSON.
+# Disk needed for the matrix store is N * dim * 4 bytes (2 with float16).
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNKS_PER_DOC = 200
+BUILD_BLOCK_DOCS = 50
+
+
+def _chunk_meta(doc, i):
+    return {"id": f"p{i // 2 + 1}-{i % 2 + 1}", "page": i // 2 + 1, "text": f"chunk {i} of document {doc}",
+            "native": ""}
+
+
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+# --- The previous JSON store, kept verbatim for comparison ---------------------
+
+def _legacy_cosine(a, b):
+    dot = sum(x*y for x,y in zip(a,b))
+    na = math.sqrt(sum(x*x for x in a)) or 1
+    nb = math.sqrt(sum(x*x for x in b)) or 1
+    return dot / (na*nb)
+
+
+def _legacy_query(path, document_id, query_embedding, top_k=5):
+    with open(path, "r") as f:
+        store = json.load(f)
+    results = []
+    for doc in store["documents"]:
+        if document_id and doc["id"] != document_id:
+            continue
+        for ch in doc["chunks"]:
+            if not ch.get("embedding"):
+                continue
+            results.append({"chunkId": ch["id"], "score": _legacy_cosine(query_embedding, ch["embedding"])})
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return results[:top_k]
+
+
+def _legacy_add(path, doc_id, chunks):
+    with open(path, "r") as f:
+        store = json.load(f)
+    store["documents"] = [d for d in store["documents"] if d["id"] != doc_id]
+    store["documents"].append({"id": doc_id, "name": doc_id, "chunks": chunks, "createdAt": None})
+    with open(path, "w") as f:
+        json.dump(store, f, indent=2)
+
+
+def bench_legacy(workdir, n, dim, rng, repeat):
+    # Outside DATA_DIR, so the matrix store does not migrate it
+    path = os.path.join(workdir, "legacy_vecstore.json")
+    docs = n // CHUNKS_PER_DOC
+    store = {"documents": [
+        {"id": f"doc{d}", "name": f"doc{d}", "createdAt": None, "chunks": [
+            dict(_chunk_meta(d, i), embedding=row.tolist())
+            for i, row in enumerate(rng.standard_normal((CHUNKS_PER_DOC, dim), dtype=np.float32))
+        ]} for d in range(docs)
+    ]}
+    with open(path, "w") as f:
+        json.dump(store, f, indent=2)
+    del store
+    q = rng.standard_normal(dim).tolist()
+    new_chunks = [dict(_chunk_meta("new", i), embedding=row.tolist())
+                  for i, row in enumerate(rng.standard_normal((CHUNKS_PER_DOC, dim), dtype=np.float32))]
+    return {
+        "size_mb": os.path.getsize(path) / 1e6,
+        "query_doc": _timed(lambda: _legacy_query(path, f"doc{docs // 2}", q), repeat),
+        "query_all": _timed(lambda: _legacy_query(path, None, q), 1),
+        "add_doc": _timed(lambda: _legacy_add(path, "docnew", new_chunks), 1),
+    }
+
+
+# --- The memory-mapped store ---------------------------------------------------
+
+def _build_matrix_store(embeddings, n, dim, dtype, rng):
+    """Write the store files directly, a block of documents at a time, so 1M rows fit in memory."""
+    docs = n // CHUNKS_PER_DOC
+    vectors_name = f"vectors-bench{embeddings._DTYPE_SUFFIX[dtype]}"
+    out = np.memmap(os.path.join(embeddings.VECSTORE_DIR, vectors_name), dtype=dtype, mode="w+",
+                    shape=(docs * CHUNKS_PER_DOC, dim))
+    documents = {}
+    for first in range(0, docs, BUILD_BLOCK_DOCS):
+        block = range(first, min(first + BUILD_BLOCK_DOCS, docs))
+        rows = embeddings._normalise(rng.standard_normal((len(block) * CHUNKS_PER_DOC, dim), dtype=np.float32))
+        out[first * CHUNKS_PER_DOC:first * CHUNKS_PER_DOC + len(rows)] = rows
+        for d in block:
+            documents[f"doc{d}"] = {"name": f"doc{d}", "start": d * CHUNKS_PER_DOC,
+                                    "end": (d + 1) * CHUNKS_PER_DOC,
+                                    "chunks": [_chunk_meta(d, i) for i in range(CHUNKS_PER_DOC)]}
+    out.flush()
+    del out
+    with open(embeddings.VECSTORE_INDEX, "w") as f:
+        json.dump({"dim": dim, "dtype": dtype, "rows": docs * CHUNKS_PER_DOC, "vectors": vectors_name,
+                   "log": embeddings._new_log(), "documents": documents}, f)
+
+
+def bench_matrix(embeddings, n, dim, dtype, rng, repeat):
+    _build_matrix_store(embeddings, n, dim, dtype, rng)
+    docs = n // CHUNKS_PER_DOC
+    embeddings._state = None
+    cold = _timed(embeddings._load, 1)
+    q = rng.standard_normal(dim).tolist()
+    new_chunks = [dict(_chunk_meta("new", i), embedding=row.tolist())
+                  for i, row in enumerate(rng.standard_normal((CHUNKS_PER_DOC, dim), dtype=np.float32))]
+    results = {
+        "size_mb": sum(os.path.getsize(os.path.join(embeddings.VECSTORE_DIR, f))
+                       for f in os.listdir(embeddings.VECSTORE_DIR)) / 1e6,
+        "load_index": cold,
+        "query_doc": _timed(lambda: embeddings.query(f"doc{docs // 2}", q), repeat),
+        "query_all": _timed(lambda: embeddings.query(None, q), max(1, repeat // 10)),
+        "add_doc": _timed(lambda: embeddings.add_document("docnew", "docnew", new_chunks), 1),
+        "compact": _timed(lambda: embeddings.compact(force=True), 1),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,1000000", help="comma-separated chunk counts")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="largest N to build the JSON store for")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--workdir", default=None, help="where to build the stores (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_vecstore_", dir=args.workdir)
+    os.environ["DATA_DIR"] = workdir
+    os.environ["VECSTORE_DTYPE"] = args.dtype
+    import embeddings  # noqa: E402 - reads DATA_DIR at import
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} dtype={args.dtype} chunks/doc={CHUNKS_PER_DOC} workdir={workdir}")
+    print(f"{'chunks':>9} {'store':>7} {'size MB':>9} {'load s':>8} {'query doc ms':>13} "
+          f"{'query all ms':>13} {'add doc s':>10} {'compact s':>10}")
+    try:
+        for n in (int(s) for s in args.sizes.split(",")):
+            if n <= args.legacy_max:
+                r = bench_legacy(workdir, n, args.dim, rng, max(1, args.repeat // 10))
+                print(f"{n:>9} {'json':>7} {r['size_mb']:>9.1f} {'-':>8} {r['query_doc'] * 1000:>13.1f} "
+                      f"{r['query_all'] * 1000:>13.1f} {r['add_doc']:>10.2f}")
+                os.remove(os.path.join(workdir, "legacy_vecstore.json"))
+            else:
+                print(f"{n:>9} {'json':>7} {'skipped (above --legacy-max)':>30}")
+            r = bench_matrix(embeddings, n, args.dim, args.dtype, rng, args.repeat)
+            print(f"{n:>9} {'mmap':>7} {r['size_mb']:>9.1f} {r['load_index']:>8.2f} {r['query_doc'] * 1000:>13.2f} "
+                  f"{r['query_all'] * 1000:>13.1f} {r['add_doc']:>10.3f} {r['compact']:>10.2f}")
+            embeddings._state = None
+            for name in os.listdir(embeddings.VECSTORE_DIR):
+                os.remove(os.path.join(embeddings.VECSTORE_DIR, name))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/fake_openai.py - local stand-in for the OpenAI chat completions + embeddings API
+#
+# Usage (from backend/):
+#   python benchmarks/fake_openai.py [--port 8765] [--latency 0.5] [--rate-limit-every 0]
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python app.py
+#
+# Replies are deterministic: every page of the prompt is echoed back prefixed
+# with "[en] " (non-Latin-1 runs replaced by "xx", so replies render with the
+# default PDF font), keeping the <<<PAGE n>>> markers of batched requests, so the
+# translation stage can be exercised (and split-checked) without the network.
+# --rate-limit-every N answers every Nth request with a 429 + retry-after.
+# Streaming requests (stream=true) get one SSE chunk per word; embeddings are
+# hashed bags of words, so texts sharing words score as similar.
+import re
+import json
+import math
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_PAGE_BLOCK = re.compile(r"<<<PAGE (\d+)>>>\s*(.*?)\s*<<<END PAGE \1>>>", re.DOTALL)
+_SINGLE_SOURCE = re.compile(r"---\n(.*?)\n---", re.DOTALL)
+_NON_LATIN1 = re.compile(r"[^\x00-\xff]+")
+
+
+def _english_stand_in(text):
+    # Non-Latin-1 runs become "xx" so replies render with the default PDF font, like real English output
+    return _NON_LATIN1.sub("xx", text)
+
+
+def fake_reply(prompt):
+    pages = _PAGE_BLOCK.findall(prompt)
+    if pages:
+        return "\n".join(f"<<<PAGE {n}>>>\n[en] {_english_stand_in(text)}\n<<<END PAGE {n}>>>" for n, text in pages)
+    match = _SINGLE_SOURCE.search(prompt)
+    return f"[en] {_english_stand_in(match.group(1) if match else prompt[:200])}"
+
+
+def fake_embedding(text, dim=64):
+    # Hashed bag of words: texts sharing words get similar vectors
+    vec = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        vec[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % dim] += 1.0
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request, count):
+        # One SSE chunk per word, like the real streaming API
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        reply = fake_reply(request["messages"][-1]["content"])
+        for word in re.findall(r"\S+\s*", reply):
+            chunk = {
+                "id": f"chatcmpl-fake-{count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        time.sleep(server.latency)
+
+        if server.rate_limit_every and count % server.rate_limit_every == 0:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            headers={"retry-after": str(server.retry_after)})
+            return
+
+        if self.path.endswith("/chat/completions") and request.get("stream"):
+            self._send_stream(request, count)
+        elif self.path.endswith("/chat/completions"):
+            prompt = request["messages"][-1]["content"]
+            self._send_json(200, {
+                "id": f"chatcmpl-fake-{count}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": fake_reply(prompt)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 0, "total_tokens": len(prompt) // 4},
+            })
+        elif self.path.endswith("/embeddings"):
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                         for i, text in enumerate(inputs)],
+                "model": request.get("model", "fake"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+def start_fake_openai(port=0, latency=0.0, rate_limit_every=0, retry_after=0.1, token_latency=0.0):
+    """Start the fake server on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.latency = latency
+    server.token_latency = token_latency
+    server.rate_limit_every = rate_limit_every
+    server.retry_after = retry_after
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds added to every response")
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between streamed chunks")
+    args = parser.parse_args()
+    server, base_url = start_fake_openai(args.port, args.latency, args.rate_limit_every, args.retry_after,
+                                         args.token_latency)
+    print(f"Fake OpenAI listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# benchmarks/fake_supabase.py - local stand-in for the Supabase REST (PostgREST) API
+#
+# Usage (from backend/):
+#   python benchmarks/fake_supabase.py [--port 8766] [--latency 0.03] [--fail-every 0]
+#   SUPABASE_URL=http://127.0.0.1:8766 SUPABASE_KEY=fake.fake.fake python app.py
+#
+# Tables live in memory. Supports what supabase_client.py uses: insert/upsert
+# (single rows or JSON arrays), select with eq/in/gte/lte/gt/lt filters, order,
+# limit/offset and single-object responses, update and delete.
+# --fail-every N answers every Nth write with a 503, to exercise retries.
+import re
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PRIMARY_KEYS = {"documents": "document_id", "chats": "chat_id", "translations": "id", "messages": "id"}
+_RESERVED_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def _parse_value(raw):
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1]
+    return raw
+
+
+def _matches(row, column, expr):
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if op == "in":
+        return str(value) in {_parse_value(v) for v in re.findall(r'"[^"]*"|[^,()]+', raw)}
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if op == "eq":
+        return str(value) == _parse_value(raw) or (isinstance(value, bool) and str(value).lower() == raw)
+    if value is None:
+        return False
+    try:
+        left, right = float(value), float(raw)
+    except (TypeError, ValueError):
+        left, right = str(value), raw
+    return {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right,
+            "neq": left != right}.get(op, False)
+
+
+class FakeSupabaseHandler(BaseHTTPRequestHandler):
+    server_version = "FakeSupabase/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parse(self):
+        url = urlsplit(self.path)
+        table = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = parse_qsl(url.query, keep_blank_values=True)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        return table, params, body
+
+    def _filtered(self, rows, params):
+        for column, expr in params:
+            if column not in _RESERVED_PARAMS:
+                rows = [r for r in rows if _matches(r, column, expr)]
+        return rows
+
+    def _respond_rows(self, rows, status=200):
+        if "vnd.pgrst.object" in (self.headers.get("Accept") or ""):
+            if len(rows) != 1:
+                self._send_json(406, {"code": "PGRST116", "hint": None,
+                                      "details": f"The result contains {len(rows)} rows",
+                                      "message": "JSON object requested, multiple (or no) rows returned"})
+                return
+            self._send_json(status, rows[0])
+            return
+        self._send_json(status, rows)
+
+    def _begin(self, method, table):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            server.requests[f"{method} {table}"] += 1
+            if method != "GET":
+                server.write_count += 1
+                failing = server.fail_every and server.write_count % server.fail_every == 0
+            else:
+                failing = False
+        time.sleep(server.latency)
+        if failing:
+            self._send_json(503, {"message": "Service temporarily unavailable", "code": "503"})
+        return not failing
+
+    def do_GET(self):
+        table, params, _ = self._parse()
+        if not self._begin("GET", table):
+            return
+        with self.server.lock:
+            rows = self._filtered(list(self.server.tables.get(table, [])), params)
+        query = dict(params)
+        for spec in reversed((query.get("order") or "").split(",")):
+            if spec:
+                column, *mods = spec.split(".")
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse="desc" in mods)
+        offset = int(query.get("offset", 0))
+        rows = rows[offset:offset + int(query["limit"])] if "limit" in query else rows[offset:]
+        columns = query.get("select", "*")
+        if columns != "*":
+            rows = [{c: r.get(c) for c in columns.split(",")} for r in rows]
+        self._respond_rows(rows)
+
+    def do_POST(self):
+        table, params, body = self._parse()
+        if not self._begin("POST", table):
+            return
+        rows = body if isinstance(body, list) else [body]
+        prefer = self.headers.get("Prefer") or ""
+        conflict = dict(params).get("on_conflict") or PRIMARY_KEYS.get(table)
+        with self.server.lock:
+            stored = self.server.tables.setdefault(table, [])
+            written = []
+            for row in rows:
+                row = dict(row)
+                row.setdefault(PRIMARY_KEYS.get(table, "id"), str(uuid.uuid4()))
+                row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                keys = conflict.split(",")
+                existing = next((r for r in stored if all(r.get(k) == row.get(k) for k in keys)), None)
+                if existing is not None:
+                    if "resolution=ignore-duplicates" in prefer:
+                        continue
+                    if "resolution=merge-duplicates" not in prefer:
+                        self._send_json(409, {"code": "23505", "details": None, "hint": None,
+                                              "message": f"duplicate key value violates unique constraint on {conflict}"})
+                        return
+                    existing.update({k: v for k, v in row.items() if k != "created_at"})
+                    written.append(existing)
+                else:
+                    stored.append(row)
+                    written.append(row)
+        self._respond_rows(written if "return=representation" in prefer else [], status=201)
+
+    def do_PATCH(self):
+        table, params, body = self._parse()
+        if not self._begin("PATCH", table):
+            return
+        with self.server.lock:
+            rows = self._filtered(self.server.tables.get(table, []), params)
+            for row in rows:
+                row.update(body or {})
+        self._respond_rows(rows)
+
+    def do_DELETE(self):
+        table, params, _ = self._parse()
+        if not self._begin("DELETE", table):
+            return
+        with self.server.lock:
+            stored = self.server.tables.get(table, [])
+            doomed = self._filtered(stored, params)
+            ids = {id(r) for r in doomed}
+            self.server.tables[table] = [r for r in stored if id(r) not in ids]
+        self._respond_rows(doomed)
+
+
+def start_fake_supabase(port=0, latency=0.0, fail_every=0):
+    """Start the fake server on a background thread; returns (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeSupabaseHandler)
+    server.latency = latency
+    server.fail_every = fail_every
+    server.tables = {}
+    server.request_count = 0
+    server.write_count = 0
+    server.requests = Counter()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds added to every response")
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+    server, url = start_fake_supabase(args.port, args.latency, args.fail_every)
+    print(f"Fake Supabase listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# cache.py - size-bounded LRU caches: SQLite-backed (shared across worker processes) and in-memory with TTL
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """Content-addressed key: sha256 over the parts, NUL-separated."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class SQLiteLRUCache:
+    """
+    Key/value text cache in a single SQLite file (WAL mode), shared by every
+    gunicorn/pool process. Each thread keeps one connection. Entries carry a
+    `version` tag so stale ones (e.g. from an older prompt) can be purged in
+    one statement.
+
+    The byte total is kept in the counters table by triggers, so a put never
+    scans the table. Lookups only read: hit/miss counts and last_used times
+    are buffered per process and written with the next put, or once
+    FLUSH_EVERY lookups / FLUSH_INTERVAL seconds have piled up.
+    """
+
+    FLUSH_EVERY = 256
+    FLUSH_INTERVAL = 5.0
+    # Least recently used entries deleted per statement while over budget
+    EVICT_BATCH = 32
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._touched = {}  # key -> last_used, not yet written
+        self._pending = {"hits": 0, "misses": 0}
+        self._last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    version TEXT,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+            # Caches created before the running total start from one full scan
+            conn.execute("INSERT OR IGNORE INTO counters SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+            conn.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS entries_bytes_insert AFTER INSERT ON entries BEGIN
+                    UPDATE counters SET value = value + new.size WHERE name = 'bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_bytes_update AFTER UPDATE OF size ON entries BEGIN
+                    UPDATE counters SET value = value + new.size - old.size WHERE name = 'bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_bytes_delete AFTER DELETE ON entries BEGIN
+                    UPDATE counters SET value = value - old.size WHERE name = 'bytes';
+                END;
+                """
+            )
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Never reuse a connection inherited across fork
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connect().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            # A broken cache must never break the caller
+            print(f"[cache] get failed for {self.path}: {e}")
+            return None
+        with self._pending_lock:
+            if row is None:
+                self._pending["misses"] += 1
+            else:
+                self._pending["hits"] += 1
+                self._touched[key] = time.time()
+            due = (self._pending["hits"] + self._pending["misses"] >= self.FLUSH_EVERY
+                   or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL)
+        if due:
+            self.flush()
+        return row[0] if row is not None else None
+
+    def put(self, key, value, version=None):
+        self.put_many([(key, value)], version=version)
+
+    def put_many(self, items, version=None):
+        """Store (key, value) pairs in one transaction, evicting once afterwards."""
+        now = time.time()
+        rows = [(key, value, version, len(value.encode("utf-8")), now) for key, value in items]
+        if not rows:
+            return
+        try:
+            with self._connect() as conn:
+                self._write_pending(conn)
+                conn.executemany(
+                    """
+                    INSERT INTO entries (key, value, version, size, last_used) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = excluded.version,
+                        size = excluded.size, last_used = excluded.last_used
+                    """,
+                    rows,
+                )
+                self._evict(conn)
+        except Exception as e:
+            print(f"[cache] put failed for {self.path}: {e}")
+
+    def flush(self):
+        """Write the buffered hit/miss counts and last_used times."""
+        try:
+            with self._connect() as conn:
+                self._write_pending(conn)
+        except Exception as e:
+            print(f"[cache] flush failed for {self.path}: {e}")
+
+    def _write_pending(self, conn):
+        with self._pending_lock:
+            touched, self._touched = self._touched, {}
+            pending, self._pending = self._pending, {"hits": 0, "misses": 0}
+            self._last_flush = time.monotonic()
+        if touched:
+            conn.executemany("UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                             [(used, key) for key, used in touched.items()])
+        for name, count in pending.items():
+            if count:
+                conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (count, name))
+
+    def _total_bytes(self, conn):
+        return conn.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0]
+
+    def _evict(self, conn):
+        evicted = 0
+        # Drop least recently used entries until we are back under the bound
+        while self._total_bytes(conn) > self.max_bytes:
+            cur = conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                (self.EVICT_BATCH,),
+            )
+            if not cur.rowcount:
+                break
+            evicted += cur.rowcount
+        if evicted:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (evicted,))
+
+    def purge(self, keep_version=None):
+        """Delete every entry, or every entry whose version is not keep_version."""
+        with self._connect() as conn:
+            if keep_version is None:
+                cur = conn.execute("DELETE FROM entries")
+            else:
+                cur = conn.execute("DELETE FROM entries WHERE version IS NOT ?", (keep_version,))
+            return cur.rowcount
+
+    def stats(self):
+        self.flush()
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": entries,
+            "max_bytes": self.max_bytes,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        }
+
+
+class TTLLRUCache:
+    """
+    In-process key/value cache bounded by an estimated byte size, with a
+    per-entry time-to-live. sizeof(value) estimates an entry's footprint.
+    Thread-safe; each process (gunicorn worker) has its own copy, so writers
+    must invalidate explicitly and the TTL bounds staleness across processes.
+    """
+
+    def __init__(self, max_bytes, ttl, sizeof=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: len(repr(value)))
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self._counters["invalidations"] += 1
+
+    def purge(self):
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return removed
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            entries, size = len(self._entries), self._bytes
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        }
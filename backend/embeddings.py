@@ -1,73 +1,523 @@
-# embeddings.py - embeddings + a simple local vector store (file-backed)
+# embeddings.py - embeddings + a local vector store (memory-mapped NumPy matrices)
+#
+# Layout under DATA_DIR/vecstore/:
+#   index.json             the compacted base: dim/dtype/row count, its vectors file,
+#                          its log file and, per document, its name, row range
+#                          [start, end) in the base matrix and chunk metadata
+#   vectors-<id>.f32|.f16  base matrix, one L2-normalised row per chunk, contiguous per document
+#   log-<id>.jsonl         append-only log of changes since the base was written:
+#                          {"op": "add", ...} points at a segment file holding the new rows,
+#                          {"op": "delete", ...} is a tombstone. A later add of the same
+#                          document replaces the earlier one.
+#   seg-<id>.f32|.f16      rows of one added document
+#
+# An add writes its segment and appends one log line under an exclusive file
+# lock (write.lock), so ingest costs O(new chunks) and is safe across worker
+# processes. A log line is only applied once its trailing newline is on disk,
+# so a crash mid-append leaves a torn line that is ignored. Compaction folds the
+# log into a new base in the background and swaps index.json atomically; readers
+# never take a lock and pick up new lines/bases by stat()ing the files.
 import os
 import json
-import math
 import uuid
-from typing import List
-import openai
+import fcntl
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional
+import numpy as np
+from cache import SQLiteLRUCache, cache_key
+from translate import _get_openai_client, _create_embeddings
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
 DATA_DIR = os.getenv("DATA_DIR", "./data")
-VECSTORE_PATH = os.path.join(DATA_DIR, "vecstore.json")
+VECSTORE_DIR = os.path.join(DATA_DIR, "vecstore")
+VECSTORE_INDEX = os.path.join(VECSTORE_DIR, "index.json")
+WRITE_LOCK_PATH = os.path.join(VECSTORE_DIR, "write.lock")
+COMPACT_LOCK_PATH = os.path.join(VECSTORE_DIR, "compact.lock")
+# Previous store: one JSON file holding every embedding; migrated on first use
+LEGACY_VECSTORE_PATH = os.path.join(DATA_DIR, "vecstore.json")
+# float16 halves disk/page-cache use; scores are still computed in float32
+VECSTORE_DTYPE = os.getenv("VECSTORE_DTYPE", "float32")
+# Compact once the log holds this many records, or this share of rows is dead
+VECSTORE_COMPACT_RECORDS = int(os.getenv("VECSTORE_COMPACT_RECORDS", "64"))
+VECSTORE_COMPACT_DEAD_FRACTION = float(os.getenv("VECSTORE_COMPACT_DEAD_FRACTION", "0.3"))
+# Rows converted to float32 at a time when scoring a float16 matrix
+_SCORE_BLOCK_ROWS = 65536
+
+_DTYPE_SUFFIX = {"float32": ".f32", "float16": ".f16"}
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Inputs per embeddings request. The API allows 2048 inputs and 300k tokens
+# per request; stay well below both so one slow batch does not stall indexing.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") == "1"
+embedding_cache = SQLiteLRUCache(
+    os.path.join(DATA_DIR, "embedding_cache.sqlite3"),
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
 
 # Ensure data dir
-os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(VECSTORE_DIR, exist_ok=True)
+
+
+def _estimate_tokens(text: str) -> int:
+    # Same rough bytes/4 estimate as retrieval.estimate_tokens
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+def _embedding_key(text: str, model: str) -> str:
+    return cache_key("embedding", model, text)
+
+
+def _encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(value: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32).tolist()
+
+
+def _pack_batches(texts: List[str]) -> List[List[str]]:
+    """Group texts into requests of at most EMBEDDING_BATCH_SIZE inputs / EMBEDDING_BATCH_TOKENS tokens."""
+    batches, batch, tokens = [], [], 0
+    for text in texts:
+        cost = _estimate_tokens(text)
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or tokens + cost > EMBEDDING_BATCH_TOKENS):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _embed_batch(batch: List[str], model: str) -> List[List[float]]:
+    r = _create_embeddings(_get_openai_client(), model=model, input=batch)
+    vectors = [d.embedding for d in sorted(r.data, key=lambda d: d.index)]
+    if EMBEDDING_CACHE_ENABLED:
+        # One cache transaction per request, not one per vector
+        embedding_cache.put_many(((_embedding_key(text, model), _encode_vector(vector))
+                                  for text, vector in zip(batch, vectors)), version=model)
+    return vectors
+
+
+def create_embeddings(texts: List[str], model=EMBEDDING_MODEL,
+                      max_in_flight: Optional[int] = None) -> List[Optional[List[float]]]:
+    """
+    Embed many texts, keeping their order. Identical texts are embedded once,
+    cached texts are served locally, and the rest go out in batched requests,
+    at most max_in_flight (EMBEDDING_MAX_IN_FLIGHT) at once. Blank texts,
+    which the API rejects, get None.
+    """
+    vectors = {}
+    pending = []
+    for text in dict.fromkeys(t for t in texts if t and t.strip()):
+        cached = embedding_cache.get(_embedding_key(text, model)) if EMBEDDING_CACHE_ENABLED else None
+        if cached is not None:
+            vectors[text] = _decode_vector(cached)
+        else:
+            pending.append(text)
+
+    if pending:
+        batches = _pack_batches(pending)
+        with ThreadPoolExecutor(max_workers=max_in_flight or EMBEDDING_MAX_IN_FLIGHT) as pool:
+            for batch, batch_vectors in zip(batches, pool.map(lambda b: _embed_batch(b, model), batches)):
+                vectors.update(zip(batch, batch_vectors))
+        print(f"[embeddings] Embedded {len(pending)} texts in {len(batches)} requests "
+              f"({len(vectors) - len(pending)} cached)")
+    return [vectors.get(t) if t else None for t in texts]
+
+
+def create_embedding(text: str, model=EMBEDDING_MODEL):
+    return create_embeddings([text], model=model)[0]
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive flock on path; yields False instead of waiting when blocking=False."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir():
+    fd = os.open(VECSTORE_DIR, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _open_rows(name, dtype, rows, dim):
+    if not rows:
+        return np.zeros((0, dim), dtype=dtype)
+    return np.memmap(os.path.join(VECSTORE_DIR, name), dtype=dtype, mode="r", shape=(rows, dim))
+
+
+class _State:
+    """
+    A base (index.json + its matrix) with the log replayed on top. Each
+    document maps to {"name", "chunks", "segment", "start", "end"}; rows live
+    in the base matrix when segment is None, else in that segment file.
+    """
+
+    def __init__(self, index, stamp):
+        self.index = index
+        self.stamp = stamp
+        self.dim = index["dim"]
+        self.dtype = index["dtype"]
+        self.base = _open_rows(index["vectors"], self.dtype, index["rows"], self.dim)
+        self.documents = {doc_id: dict(doc, segment=None) for doc_id, doc in index["documents"].items()}
+        self.log_path = os.path.join(VECSTORE_DIR, index["log"])
+        self.log_offset = 0
+        self.records = 0
+        self._segments = {}
+
+    def tail(self):
+        """Apply log lines appended since the last call; a torn final line waits for its newline."""
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.apply(json.loads(line))
+        self.log_offset += end
+
+    def apply(self, record):
+        self.records += 1
+        if record["op"] == "add":
+            self.dim = self.dim or record["dim"]
+            self.documents[record["doc"]] = {"name": record["name"], "chunks": record["chunks"],
+                                             "segment": record["segment"], "start": 0, "end": record["rows"]}
+        elif record["op"] == "delete":
+            self.documents.pop(record["doc"], None)
+
+    def rows(self, doc):
+        if doc["segment"] is None:
+            return self.base[doc["start"]:doc["end"]]
+        matrix = self._segments.get(doc["segment"])
+        if matrix is None:
+            matrix = self._segments[doc["segment"]] = _open_rows(doc["segment"], self.dtype, doc["end"], self.dim)
+        return matrix
+
+    def dead_fraction(self):
+        live_base = sum(doc["end"] - doc["start"] for doc in self.documents.values() if doc["segment"] is None)
+        segment_rows = sum(doc["end"] for doc in self.documents.values() if doc["segment"] is not None)
+        total = self.index["rows"] + segment_rows
+        return (self.index["rows"] - live_base) / total if total else 0.0
+
+
+_state = None
+_state_lock = threading.RLock()
+
+
+def _index_stamp():
+    try:
+        st = os.stat(VECSTORE_INDEX)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
 
 def _ensure_store():
-    if not os.path.exists(VECSTORE_PATH):
-        with open(VECSTORE_PATH, "w") as f:
-            json.dump({"documents": []}, f, indent=2)
+    # Called before taking the write lock: _init_store takes it itself
+    if _index_stamp() is None:
+        _init_store()
+
+
+def _load():
+    """Current state: re-read when index.json was replaced, else just tail the log."""
+    global _state
+    with _state_lock:
+        for _ in range(3):
+            stamp = _index_stamp()
+            try:
+                if _state is None or _state.stamp != stamp:
+                    with open(VECSTORE_INDEX, "r") as f:
+                        _state = _State(json.load(f), stamp)
+                _state.tail()
+                return _state
+            except FileNotFoundError:
+                # A compaction swapped the base between our stat() and open(); retry
+                _state = None
+        raise RuntimeError("Vector store index keeps changing under the reader")
 
-def _load_store():
-    _ensure_store()
-    with open(VECSTORE_PATH, "r") as f:
-        return json.load(f)
 
-def _save_store(store):
-    with open(VECSTORE_PATH, "w") as f:
-        json.dump(store, f, indent=2)
+def _write_index(index):
+    tmp_path = f"{VECSTORE_INDEX}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, VECSTORE_INDEX)
+    _fsync_dir()
+
+
+def _new_log(data=b""):
+    name = f"log-{uuid.uuid4().hex}.jsonl"
+    with open(os.path.join(VECSTORE_DIR, name), "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return name
+
+
+def _init_store():
+    """Create an empty store, importing vecstore.json if one is lying around."""
+    with _file_lock(WRITE_LOCK_PATH):
+        if _index_stamp() is not None:
+            return
+        legacy_docs = []
+        if os.path.exists(LEGACY_VECSTORE_PATH):
+            with open(LEGACY_VECSTORE_PATH, "r") as f:
+                legacy = json.load(f)
+            for doc in legacy.get("documents", []):
+                meta, vectors = _split_chunks(doc.get("chunks", []))
+                if vectors is not None:
+                    legacy_docs.append((doc["id"], doc.get("name"), meta, vectors))
+        dim = len(legacy_docs[0][3][0]) if legacy_docs else 0
+        index = _write_base(legacy_docs, dim, VECSTORE_DTYPE)
+        index["log"] = _new_log()
+        _write_index(index)
+        if os.path.exists(LEGACY_VECSTORE_PATH):
+            os.replace(LEGACY_VECSTORE_PATH, LEGACY_VECSTORE_PATH + ".migrated")
+            print(f"[vecstore] Migrated {len(legacy_docs)} documents from {LEGACY_VECSTORE_PATH}")
+
+
+def _write_base(docs, dim, dtype):
+    """
+    Write a base matrix for docs: [(doc_id, name, chunk metadata, rows)], where
+    rows is any (n, dim) array. Returns the index entry (without "log").
+    """
+    rows = sum(len(r) for *_, r in docs)
+    vectors_name = None
+    documents = {}
+    out = None
+    if rows:
+        vectors_name = f"vectors-{uuid.uuid4().hex}{_DTYPE_SUFFIX[dtype]}"
+        out = np.memmap(os.path.join(VECSTORE_DIR, vectors_name), dtype=dtype, mode="w+", shape=(rows, dim))
+    cursor = 0
+    for doc_id, name, chunks, doc_rows in docs:
+        if len(doc_rows):
+            out[cursor:cursor + len(doc_rows)] = doc_rows
+        documents[doc_id] = {"name": name, "start": cursor, "end": cursor + len(doc_rows), "chunks": chunks}
+        cursor += len(doc_rows)
+    if out is not None:
+        out.flush()
+        del out
+    return {"dim": dim, "dtype": dtype, "rows": rows, "vectors": vectors_name, "documents": documents}
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _split_chunks(chunks):
+    """Chunk metadata (without embeddings) and their normalised vectors."""
+    with_vectors = [ch for ch in chunks if ch.get("embedding")]
+    meta = [{k: v for k, v in ch.items() if k != "embedding"} for ch in with_vectors]
+    vectors = _normalise([ch["embedding"] for ch in with_vectors]) if with_vectors else None
+    return meta, vectors
+
+
+def _append(record):
+    """Append one log record; the caller holds the write lock."""
+    state = _load()
+    with open(state.log_path, "r+b") as f:
+        # Anything past the last complete line is a torn append from a crash
+        f.truncate(state.log_offset)
+        f.seek(state.log_offset)
+        f.write(json.dumps(record).encode("utf-8") + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    state = _load()
+    if (state.records >= VECSTORE_COMPACT_RECORDS
+            or state.dead_fraction() > VECSTORE_COMPACT_DEAD_FRACTION):
+        threading.Thread(target=_compact_quietly, daemon=True).start()
 
-def create_embedding(text: str, model="text-embedding-3-small"):
-    r = openai.Embedding.create(model=model, input=text)
-    return r["data"][0]["embedding"]
 
 def add_document(doc_id: str, name: str, chunks: List[dict]):
     """
-    chunks: list of { id, text, embedding }
+    chunks: list of { id, text, embedding } plus optional metadata
+    (e.g. page, native) that is returned with query results.
+    Replaces any existing document with the same id.
     """
-    store = _load_store()
-    # remove existing with same id
-    store["documents"] = [d for d in store["documents"] if d["id"] != doc_id]
-    store["documents"].append({
-        "id": doc_id,
-        "name": name,
-        "chunks": chunks,
-        "createdAt": None
-    })
-    _save_store(store)
-
-def _cosine(a, b):
-    dot = sum(x*y for x,y in zip(a,b))
-    na = math.sqrt(sum(x*x for x in a)) or 1
-    nb = math.sqrt(sum(x*x for x in b)) or 1
-    return dot / (na*nb)
-
-def query(document_id: str, query_embedding, top_k=5):
-    store = _load_store()
-    results = []
-    for doc in store["documents"]:
-        if document_id and doc["id"] != document_id:
+    meta, vectors = _split_chunks(chunks)
+    _ensure_store()
+    with _file_lock(WRITE_LOCK_PATH):
+        state = _load()
+        segment = None
+        if vectors is not None:
+            if state.dim and vectors.shape[1] != state.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({state.dim})")
+            segment = f"seg-{uuid.uuid4().hex}{_DTYPE_SUFFIX[state.dtype]}"
+            out = np.memmap(os.path.join(VECSTORE_DIR, segment), dtype=state.dtype, mode="w+", shape=vectors.shape)
+            out[:] = vectors
+            out.flush()
+            del out
+        _append({"op": "add", "doc": doc_id, "name": name, "segment": segment,
+                 "rows": 0 if vectors is None else len(vectors),
+                 "dim": state.dim if vectors is None else vectors.shape[1], "chunks": meta})
+
+
+def has_document(doc_id: str) -> bool:
+    _ensure_store()
+    return doc_id in _load().documents
+
+
+def delete_document(doc_id: str):
+    _ensure_store()
+    with _file_lock(WRITE_LOCK_PATH):
+        if doc_id in _load().documents:
+            _append({"op": "delete", "doc": doc_id})
+
+
+def compact(force=False) -> bool:
+    """
+    Fold the log into a new base matrix and drop dead rows and segment files.
+    Only one process compacts at a time; others return False immediately.
+    Rows are copied without the write lock, so ingest keeps going; records
+    appended meanwhile are carried over into the new log.
+    """
+    with _file_lock(COMPACT_LOCK_PATH, blocking=False) as acquired:
+        if not acquired:
+            return False
+        _ensure_store()
+        with _state_lock:
+            state = _load()
+            if not force and not state.records and not state.dead_fraction():
+                return False
+            # Freeze what we fold in: later appends are carried over below
+            log_offset = state.log_offset
+            docs = [(doc_id, doc["name"], doc["chunks"], state.rows(doc)) for doc_id, doc in sorted(
+                state.documents.items(), key=lambda item: (item[1]["segment"] is not None, item[1]["start"]))]
+        index = _write_base(docs, state.dim, state.dtype)
+
+        with _file_lock(WRITE_LOCK_PATH):
+            with open(state.log_path, "rb") as f:
+                f.seek(log_offset)
+                carried = f.read()
+            carried = carried[:carried.rfind(b"\n") + 1]
+            index["log"] = _new_log(carried)
+            _write_index(index)
+            # Drop the old base, folded segments and leftovers of crashed writers;
+            # segments still referenced by carried-over records stay
+            keep = {index["vectors"], index["log"]}
+            keep.update(json.loads(line).get("segment") for line in carried.splitlines() if line.strip())
+            for name in os.listdir(VECSTORE_DIR):
+                if name.startswith(("vectors-", "log-", "seg-", "index.json.")) and name not in keep:
+                    try:
+                        os.remove(os.path.join(VECSTORE_DIR, name))
+                    except OSError:
+                        pass
+        print(f"[vecstore] Compacted the log into {index['rows']} rows")
+        return True
+
+
+def _compact_quietly():
+    try:
+        compact()
+    except Exception as e:
+        print(f"[vecstore] Compaction failed: {e}")
+
+
+def _scores(matrix, q):
+    if matrix.dtype == np.float32:
+        return matrix @ q
+    # No BLAS for float16: score in float32 blocks to bound the temporary copies
+    out = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+        out[start:start + _SCORE_BLOCK_ROWS] = matrix[start:start + _SCORE_BLOCK_ROWS].astype(np.float32) @ q
+    return out
+
+
+def _top_k(scores, k):
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _query(state, document_id, q, top_k):
+    with _state_lock:  # another thread may be tailing the log into state.documents
+        if document_id:
+            doc = state.documents.get(document_id)
+            docs = [(document_id, doc)] if doc else []
+        else:
+            docs = list(state.documents.items())
+    # Unfiltered: one product over the whole base; dead rows are never looked up
+    base_scores = None if document_id else _scores(state.base, q)
+
+    owners, parts = [], []
+    for doc_id, doc in docs:
+        if doc["end"] == doc["start"]:
             continue
-        for ch in doc["chunks"]:
-            if not ch.get("embedding"):
-                continue
-            score = _cosine(query_embedding, ch["embedding"])
-            results.append({
-                "docId": doc["id"],
-                "docName": doc.get("name"),
-                "chunkId": ch["id"],
-                "text": ch["text"],
-                "score": score
-            })
-    results.sort(key=lambda r: r["score"], reverse=True)
-    return results[:top_k]
+        if doc["segment"] is None and base_scores is not None:
+            parts.append(base_scores[doc["start"]:doc["end"]])
+        else:
+            parts.append(_scores(state.rows(doc), q))
+        owners.append((doc_id, doc))
+    if not parts:
+        return []
+
+    scores = np.concatenate(parts)
+    sizes = [len(p) for p in parts]
+    owner_of = np.repeat(np.arange(len(parts)), sizes)
+    first_row = np.cumsum([0] + sizes)
+    results = []
+    for i in _top_k(scores, top_k):
+        part = int(owner_of[i])
+        doc_id, doc = owners[part]
+        ch = doc["chunks"][int(i - first_row[part])]
+        results.append({
+            "docId": doc_id,
+            "docName": doc.get("name"),
+            "chunkId": ch["id"],
+            "text": ch["text"],
+            "page": ch.get("page"),
+            "native": ch.get("native"),
+            "score": float(scores[i]),
+        })
+    return results
+
+
+def query(document_id: Optional[str], query_embedding, top_k=5):
+    """
+    Top-k chunks by cosine similarity. With document_id only that document's
+    rows are scored; without it every live row is.
+    """
+    global _state
+    _ensure_store()
+    state = _load()
+    if not state.dim or top_k <= 0:
+        return []
+    if len(query_embedding) != state.dim:
+        print(f"[vecstore] Query dimension {len(query_embedding)} does not match the store ({state.dim})")
+        return []
+    q = _normalise(query_embedding)
+    try:
+        return _query(state, document_id, q, top_k)
+    except FileNotFoundError:
+        # A segment was compacted away after we loaded the state
+        with _state_lock:
+            _state = None
+        return _query(_load(), document_id, q, top_k)
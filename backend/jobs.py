@@ -0,0 +1,215 @@
+# jobs.py - SQLite-backed upload job queue + process pool that runs the pipeline
+import os
+import json
+import sqlite3
+import time
+import uuid
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+JOBS_DB_PATH = os.path.join(DATA_DIR, "jobs.sqlite3")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+# Unfinished jobs with no owner recorded (created before owner_pid existed)
+# count as abandoned once they have not been updated for this long
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "3600"))
+
+# Ensure data dir
+os.makedirs(DATA_DIR, exist_ok=True)
+
+_JOB_FIELDS = {"status", "stage", "pages_done", "page_count", "document_id", "error", "result"}
+_UNFINISHED = ("queued", "running")
+_ABANDONED_ERROR = "The server restarted before this upload finished; please upload the file again"
+
+_executor = None
+_worker_initializer = None
+
+
+def _connect():
+    # One short-lived connection per call: the db is shared by the web
+    # workers (reads) and the pool processes (progress writes).
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _ensure_db():
+    with _connect() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                document_id TEXT,
+                user_id TEXT,
+                filename TEXT,
+                status TEXT NOT NULL,
+                stage TEXT,
+                pages_done INTEGER DEFAULT 0,
+                page_count INTEGER,
+                error TEXT,
+                result TEXT,
+                created_at REAL,
+                updated_at REAL,
+                owner_pid INTEGER
+            )
+            """
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_abandoned(job):
+    """
+    The queue lives in the memory of the process that submitted the job, so a
+    queued/running job whose owner process is gone will never finish.
+    """
+    if job["status"] not in _UNFINISHED:
+        return False
+    if job["owner_pid"] is not None:
+        return not _process_alive(job["owner_pid"])
+    return time.time() - (job["updated_at"] or 0) > JOB_STALE_SECONDS
+
+
+def _fail_unfinished(job_ids, error):
+    """Mark jobs failed unless they already finished (done/failed rows are left alone)."""
+    with _connect() as conn:
+        conn.executemany(
+            "UPDATE jobs SET status = 'failed', stage = 'failed', error = ?, updated_at = ? "
+            f"WHERE job_id = ? AND status IN {_UNFINISHED}",
+            [(error, time.time(), job_id) for job_id in job_ids],
+        )
+
+
+def _fail_abandoned(job_ids):
+    if not job_ids:
+        return
+    _fail_unfinished(job_ids, _ABANDONED_ERROR)
+    print(f"[jobs] Marked {len(job_ids)} abandoned job(s) as failed")
+
+
+def fail_abandoned_jobs():
+    """Fail the unfinished jobs left behind by server processes that have exited."""
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT * FROM jobs WHERE status IN {_UNFINISHED}").fetchall()
+    _fail_abandoned([row["job_id"] for row in rows if _is_abandoned(row)])
+
+
+_ensure_db()
+fail_abandoned_jobs()
+
+
+def create_job(document_id, user_id, filename):
+    """Record a queued job owned by this process, which must also submit_job it."""
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (job_id, document_id, user_id, filename, status, stage, pages_done, "
+            "created_at, updated_at, owner_pid) VALUES (?, ?, ?, ?, 'queued', 'queued', 0, ?, ?, ?)",
+            (job_id, document_id, user_id, filename, now, now, os.getpid()),
+        )
+    return job_id
+
+
+def update_job(job_id, **fields):
+    unknown = set(fields) - _JOB_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+    if "result" in fields and fields["result"] is not None:
+        fields["result"] = json.dumps(fields["result"])
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    try:
+        with _connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+    except Exception as e:
+        # Progress reporting must never take the pipeline down with it
+        print(f"[jobs] update_job failed for {job_id}: {e}")
+
+
+def get_job(job_id):
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+    if _is_abandoned(row):
+        # Its owner died while this server kept running (e.g. a recycled gunicorn worker)
+        _fail_abandoned([job_id])
+        return get_job(job_id)
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def _run_job(job_id, target, kwargs):
+    """
+    Runs inside a pool process: executes target(progress=..., **kwargs) and
+    records its outcome on the job row.
+    """
+    update_job(job_id, status="running", stage="starting")
+
+    def progress(stage, **fields):
+        update_job(job_id, stage=stage, **fields)
+
+    try:
+        result = target(progress=progress, **kwargs)
+    except Exception as e:
+        print(f"[jobs] Job {job_id} failed: {e}")
+        print(traceback.format_exc())
+        update_job(job_id, status="failed", stage="failed", error=str(e))
+        return
+    update_job(job_id, status="done", stage="done", result=result)
+
+
+def set_worker_initializer(initializer):
+    """Register a callable run once in each pool process when it starts (e.g. model warm-up)."""
+    global _worker_initializer
+    _worker_initializer = initializer
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, initializer=_worker_initializer)
+    return _executor
+
+
+def _on_job_finished(job_id):
+    def callback(future):
+        global _executor
+        exc = future.exception()
+        if exc is None:
+            return
+        # _run_job records its own failures, so getting here means the
+        # worker process itself died (BrokenProcessPool); start a fresh pool.
+        # The broken pool fails every future it holds, including ones whose
+        # job already finished, so only unfinished rows are touched.
+        print(f"[jobs] Worker crashed while running job {job_id}: {exc}")
+        try:
+            _fail_unfinished([job_id], f"Worker crashed: {exc}")
+        except Exception as e:
+            print(f"[jobs] Could not record crash of job {job_id}: {e}")
+        _executor = None
+    return callback
+
+
+def submit_job(job_id, target, **kwargs):
+    """
+    Queue target(progress=..., **kwargs) on the worker pool. target must be a
+    module-level function so it can be pickled into the pool process.
+    """
+    future = _get_executor().submit(_run_job, job_id, target, kwargs)
+    future.add_done_callback(_on_job_finished(job_id))
+    return future
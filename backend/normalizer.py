@@ -0,0 +1,94 @@
+# normalizer.py - single-pass cleanup of raw OCR text (ocr.clean_ocr_text)
+#
+# Runs once per OCR candidate (up to 14 per page), so the patterns are
+# compiled once, noise words are sets, and each line is filtered, stripped
+# and word-filtered in one pass.
+import re
+
+# A run of 4+ identical characters marks a line as an OCR artifact
+_REPEATED_RUN = re.compile(r'(.)\1{3,}')
+# Common OCR noise syllables, matched on the lower-cased line
+_NOISE_SYLLABLE = re.compile(r'\b(jey|ve|je|ye|ey)\b')
+# Everything except word characters, whitespace, our scripts and basic punctuation
+_UNWANTED_CHARS = re.compile(r'[^\w\s\u0900-\u097F\u0D80-\u0DFF\n।॥.,!?;:()]')
+_WORD_REPEATED_RUN = re.compile(r'(.)\1{2,}')
+
+DEVANAGARI = re.compile(r'[\u0900-\u097F]')
+SINHALA = re.compile(r'[\u0D80-\u0DFF]')
+# Whitespace-separated words with a Latin letter and nothing from the native script
+_LATIN_ONLY_WORD = {
+    "nep": re.compile(r'(?<!\S)[^\s\u0900-\u097Fa-zA-Z]*[a-zA-Z][^\s\u0900-\u097F]*(?!\S)'),
+    "sin": re.compile(r'(?<!\S)[^\s\u0D80-\u0DFFa-zA-Z]*[a-zA-Z][^\s\u0D80-\u0DFF]*(?!\S)'),
+}
+
+_NEPALI_NOISE_WORDS = frozenset([
+    'jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be',
+    'jeyy', 'jeyyy', 'jeyyyy', 'jeyyyyy',
+    'vey', 'veyy', 'veyyy',
+    'jeyjey', 'jeyjeyjey',
+    'jeje', 'jejeje',
+    'yeye', 'yeyeye',
+    'ey', 'eyey', 'eyeyey',
+    'y', 'yy', 'yyy', 'yyyy', 'yyyyy',
+    'e', 'ee', 'eee', 'eeee', 'eeeee',
+    'j', 'jj', 'jjj', 'jjjj', 'jjjjj',
+    'v', 'vv', 'vvv', 'vvvv', 'vvvvv',
+])
+_SINHALA_NOISE_WORDS = frozenset(['jey', 've', 'je', 'ye', 'the', 'and', 'or', 'is', 'be'])
+
+# target language -> (native script, Latin-only words, script-less lines with at
+# most this many words are dropped, noise words, drop words with a 3+ character run)
+_SCRIPT_RULES = {
+    "nep": (DEVANAGARI, _LATIN_ONLY_WORD["nep"], 1, _NEPALI_NOISE_WORDS, True),
+    "nepali": (DEVANAGARI, _LATIN_ONLY_WORD["nep"], 1, _NEPALI_NOISE_WORDS, True),
+    "sin": (SINHALA, _LATIN_ONLY_WORD["sin"], 2, _SINHALA_NOISE_WORDS, False),
+    "sinhala": (SINHALA, _LATIN_ONLY_WORD["sin"], 2, _SINHALA_NOISE_WORDS, False),
+}
+
+
+def is_artifact_line(line):
+    """
+    True for lines that are OCR artifacts: a run of 4+ identical characters,
+    one character making up over 60% of the line, or a noise syllable.
+    """
+    if _REPEATED_RUN.search(line) or _NOISE_SYLLABLE.search(line.lower()):
+        return True
+    stripped = line.strip()
+    # A character with over half the line is its median once sorted
+    return len(stripped) > 5 and stripped.count(sorted(stripped)[len(stripped) // 2]) / len(stripped) > 0.6
+
+
+def drop_artifact_lines(text):
+    return '\n'.join(line for line in text.split('\n') if not is_artifact_line(line))
+
+
+def normalize_ocr_text(text, target_lang="nep"):
+    """
+    Drop artifact lines, strip unwanted characters and, for Nepali/Sinhala,
+    drop script-less noise lines and stray Latin words, one line at a time.
+    """
+    rules = _SCRIPT_RULES.get(target_lang)
+    cleaned_lines = []
+    for line in text.split('\n'):
+        if is_artifact_line(line):
+            continue
+        line = _UNWANTED_CHARS.sub('', line)
+        if rules is None:
+            cleaned_lines.append(line)
+            continue
+
+        script, latin_only_word, max_noise_words, noise_words, drop_runs = rules
+        words = line.split()
+        if not script.search(line) and len(words) <= max_noise_words:
+            continue
+        # Stray Latin words depend only on the word, so they are decided once per distinct word
+        dropped = set()
+        for word in set(latin_only_word.findall(line)):
+            lowered = word.lower()
+            if lowered in noise_words or len(word) <= 3 or (drop_runs and _WORD_REPEATED_RUN.search(lowered)):
+                dropped.add(word)
+        if dropped:
+            words = [word for word in words if word not in dropped]
+        if words:
+            cleaned_lines.append(' '.join(words))
+    return '\n'.join(cleaned_lines)
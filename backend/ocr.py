@@ -1,36 +1,74 @@
 # ocr.py - helpers to OCR images and PDFs using tesseract & pdf2image
+import io
 import os
-import tempfile
-from pdf2image import convert_from_path
-import pytesseract
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
+from ocr_engines import get_engine
+from normalizer import DEVANAGARI, SINHALA, drop_artifact_lines, normalize_ocr_text
 
 # Ensure TESSDATA_PREFIX or tesseract is installed on PATH
 # For Nepali/Sinhala ensure nep.traineddata and sin.traineddata are in tessdata
 
+# Page-level parallelism for PDF uploads. Each upload job opens its own pool
+# of OCR_WORKERS tesseract workers. Every web worker (WEB_CONCURRENCY, which
+# gunicorn also reads as its -w default) runs up to UPLOAD_WORKERS jobs at
+# once, so the default splits the cores between all of them, and tesseract's
+# OpenMP threads are capped per worker to keep
+# WEB_CONCURRENCY * UPLOAD_WORKERS * OCR_WORKERS * OCR_TESSERACT_THREADS <= cores.
+_CONCURRENT_JOBS = (max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+                    * max(1, int(os.getenv("UPLOAD_WORKERS", "2"))))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // _CONCURRENT_JOBS))))
+OCR_TESSERACT_THREADS = int(os.getenv("OCR_TESSERACT_THREADS", "1"))
+
+# PDFs are rasterized this many pages at a time so peak memory does not grow
+# with the page count.
+OCR_RASTER_WINDOW = int(os.getenv("OCR_RASTER_WINDOW", "4"))
+
+# Page OCR strategy: "confidence" scores candidates with image_to_data and
+# stops at the first one that clears OCR_CONFIDENCE_THRESHOLD (mean word
+# confidence, 0-100) with enough of its letters in the target script;
+# "exhaustive" is the original sweep that keeps the longest reasonable output.
+OCR_MODE = os.getenv("OCR_MODE", "confidence")
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "75"))
+OCR_MIN_SCRIPT_COVERAGE = float(os.getenv("OCR_MIN_SCRIPT_COVERAGE", "0.6"))
+
+# Unicode ranges of the scripts we OCR, keyed by tesseract language code
+SCRIPT_PATTERNS = {
+    "nep": re.compile(r'[\u0900-\u097F]'),
+    "sin": re.compile(r'[\u0D80-\u0DFF]'),
+    "eng": re.compile(r'[A-Za-z]'),
+}
+# Tesseract language/script names that can recognise each script
+SCRIPT_LANG_TAGS = {
+    "nep": ("nep", "Devanagari"),
+    "sin": ("sin", "Sinhala"),
+    "eng": ("eng", "Latin"),
+}
+
+# Language detection is one multi-script pass whose Unicode-block histogram
+# picks the script. With OCR_PAGE_SCRIPT_DETECTION every page gets the same
+# pass first (it doubles as the first OCR candidate), so mixed-language
+# documents only run the candidates for each page's own script.
+DETECTION_LANGS = os.getenv("OCR_DETECTION_LANGS", "nep+sin+eng")
+DETECTION_CONFIG = "--oem 3 --psm 6"
+OCR_PAGE_SCRIPT_DETECTION = os.getenv("OCR_PAGE_SCRIPT_DETECTION", "1") == "1"
+
+
 def ocr_image_bytes(image_bytes, langs="nep+sin+eng"):
     """
     image_bytes: raw bytes (PNG/JPEG)
     langs: tesseract languages string (e.g. 'nep' or 'sin' or 'nep+sin')
     returns: extracted text
     """
-    img = Image.open(tempfile.SpooledTemporaryFile().write(image_bytes) or image_bytes)  # not used directly
-    # Simpler: load using PIL from bytes
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    try:
-        tmp.write(image_bytes)
-        tmp.flush()
-        text = pytesseract.image_to_string(Image.open(tmp.name), lang=langs)
-        return text
-    finally:
-        tmp.close()
-        try:
-            os.unlink(tmp.name)
-        except Exception:
-            pass
+    return ocr_image_pil(Image.open(io.BytesIO(image_bytes)), langs=langs)
 
 def ocr_image_pil(image: Image.Image, langs="nep+sin+eng"):
-    return pytesseract.image_to_string(image, lang=langs)
+    engine = get_engine()
+    with engine.page(image) as page:
+        return engine.image_to_string(page, lang=langs)
 
 def ocr_pdf(path_to_pdf, langs="nep+sin+eng", dpi=300, first_n_pages=None):
     """
@@ -38,12 +76,350 @@ def ocr_pdf(path_to_pdf, langs="nep+sin+eng", dpi=300, first_n_pages=None):
     Returns concatenated text.
     Requires poppler (pdftoppm) for pdf2image.
     """
-    pages = convert_from_path(path_to_pdf, dpi=dpi)
+    page_count = pdf_page_count(path_to_pdf)
     if first_n_pages:
-        pages = pages[:first_n_pages]
+        page_count = min(page_count, first_n_pages)
     all_text = []
-    for page in pages:
-        txt = pytesseract.image_to_string(page, lang=langs)
-        all_text.append(txt)
+    for page in iter_pdf_pages(path_to_pdf, dpi=dpi, page_count=page_count):
+        all_text.append(ocr_image_pil(page, langs=langs))
     return "\n\n".join(all_text)
-s
\ No newline at end of file
+
+
+def pdf_page_count(path_to_pdf):
+    """Page count from the PDF metadata (pdfinfo), without rasterizing anything."""
+    return int(pdfinfo_from_path(path_to_pdf)["Pages"])
+
+
+def iter_pdf_pages(path_to_pdf, dpi=300, page_count=None, window=None):
+    """
+    Lazily rasterize a PDF, yielding one PIL image per page in order.
+    Only `window` pages are rendered at a time (via first_page/last_page),
+    read straight from pdftoppm's PPM output without touching the disk,
+    so memory stays flat however long the document is.
+    """
+    page_count = page_count or pdf_page_count(path_to_pdf)
+    window = window or OCR_RASTER_WINDOW
+    for first_page in range(1, page_count + 1, window):
+        last_page = min(first_page + window - 1, page_count)
+        images = convert_from_path(path_to_pdf, dpi=dpi, first_page=first_page, last_page=last_page)
+        while images:
+            yield images.pop(0)  # dropped here, so only the unconsumed pages stay referenced
+
+
+def preprocess_image(img):
+    """
+    Grayscale + minimal contrast enhancement applied to every page before OCR
+    """
+    from PIL import ImageEnhance
+
+    # Convert to grayscale for better OCR
+    if img.mode != 'L':
+        img = img.convert('L')
+
+    # Ultra-conservative preprocessing for Nepali text
+    enhancer = ImageEnhance.Contrast(img)
+    img = enhancer.enhance(1.1)  # Minimal contrast enhancement
+
+    # Skip noise reduction to preserve text details
+    # Skip sharpening to preserve original text clarity
+    return img
+
+
+def script_histogram(text):
+    """Count the characters of text in each script we OCR (Unicode-block histogram)."""
+    return {lang: len(pattern.findall(text)) for lang, pattern in SCRIPT_PATTERNS.items()}
+
+
+def dominant_script(text, default="nep"):
+    """
+    Pick nep/sin/eng from the script histogram of text. Latin only wins when
+    it clearly outweighs the native script, since OCR of Devanagari/Sinhala
+    pages often produces stray Latin letters.
+    """
+    hist = script_histogram(text)
+    native = max(("nep", "sin"), key=lambda lang: hist[lang])  # nep wins ties
+    if hist["eng"] > 2 * hist[native]:
+        return "eng"
+    if hist[native] == 0:
+        return default
+    return native
+
+
+def run_detection_pass(page, engine=None):
+    """
+    One multi-script OCR pass (DETECTION_LANGS) over a preprocessed page
+    (from engine.page()). The result doubles as an OCR candidate for
+    extract_text_from_image(seed=...).
+    """
+    engine = engine or get_engine()
+    data = engine.image_to_data(page, lang=DETECTION_LANGS, config=DETECTION_CONFIG)
+    return {"langs": DETECTION_LANGS, "config": DETECTION_CONFIG, "data": data}
+
+
+def detect_document_language(file_path):
+    """
+    Detect the primary language of the document from the script histogram of
+    one multi-script OCR pass over its first page.
+    Returns (lang, first_page_ocr); first_page_ocr is the detection pass,
+    to be handed to the OCR of page 1 so that page is not processed twice.
+    """
+    try:
+        if file_path.lower().endswith('.pdf'):
+            # Same DPI as the main OCR stage so the pass can be reused
+            image = next(iter_pdf_pages(file_path, dpi=300, page_count=1))
+        else:
+            image = Image.open(file_path)
+        engine = get_engine()
+        with engine.page(preprocess_image(image)) as page:
+            first_page_ocr = run_detection_pass(page, engine)
+    except Exception as e:
+        print(f"[language_detection] Error: {e}")
+        return "nep", None  # Default fallback
+
+    text, confidence = _text_and_confidence(first_page_ocr["data"])
+    lang = dominant_script(text)
+    print(f"[language_detection] Detected language: {lang} "
+          f"(script histogram: {script_histogram(text)}, confidence: {confidence:.1f})")
+    return lang, first_page_ocr
+
+
+def _candidate_langs(requested):
+    return [
+        f"{requested}+eng",
+        requested,
+        f"{requested}+sin+eng",
+        "script/Devanagari+eng",
+        "nep+eng",
+        "sin+eng",
+        "eng",
+    ]
+
+
+def extract_text_from_image(image, lang="nep", mode=None, seed=None, engine=None):
+    """
+    Enhanced OCR text extraction with preprocessing and cleaning.
+    image: a PIL image (e.g. a rasterized page) or an image file path
+    mode: "confidence" (default, see OCR_MODE) or "exhaustive"
+    seed: a run_detection_pass result for this page, reused as its first
+          candidate in confidence mode
+    engine: OCR engine name (see ocr_engines.OCR_ENGINE)
+    """
+    engine = get_engine(engine)
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+
+    # First, try to preprocess the image for better OCR
+    try:
+        image = preprocess_image(image)
+    except Exception as e:
+        print(f"Image preprocessing failed: {e}")
+    
+    requested = lang or "nep"
+    
+    # Ultra-conservative OCR configurations for Nepali text
+    configs = [
+        "--oem 3 --psm 6",  # Uniform block with LSTM (most accurate)
+        "--oem 3 --psm 7",  # Single text line with LSTM
+    ]
+
+    # Prepared once (one PNM file for pytesseract); every candidate pass reuses it
+    with engine.page(image) as page:
+        if (mode or OCR_MODE) == "exhaustive":
+            return _exhaustive_ocr(engine, page, requested, _candidate_langs(requested), configs)
+        return _confidence_ocr(engine, page, requested, configs, seed=seed)
+
+
+def _exhaustive_ocr(engine, page, requested, candidates, configs):
+    """Run every language/config pair and keep the longest reasonable output."""
+    best_text = ""
+    max_reasonable_length = 0
+
+    for langs in candidates:
+        for cfg in configs:
+            try:
+                txt = engine.image_to_string(page, lang=langs, config=cfg)
+                if txt and txt.strip():
+                    cleaned_txt = clean_ocr_text(txt, target_lang=requested)
+                    # Prefer longer, more reasonable text
+                    if len(cleaned_txt.strip()) > max_reasonable_length and is_reasonable_ocr_output(cleaned_txt, target_lang=requested):
+                        best_text = cleaned_txt
+                        max_reasonable_length = len(cleaned_txt.strip())
+            except Exception as e:
+                print(f"OCR failed with {langs}, {cfg}: {e}")
+                pass
+
+    return best_text
+
+
+def _confidence_ocr(engine, page, requested, configs, seed=None):
+    """
+    Try language/config pairs in order of likelihood, scoring each by mean
+    word confidence and target-script coverage. Returns as soon as one
+    clears the thresholds, so only low-confidence pages pay for the rest.
+    With a detection pass (seed or per-page) the page's own script decides
+    the target language and which candidates are worth running.
+    """
+    base_lang = requested.split("+")[0]
+    target = base_lang
+    candidates = _candidate_langs(requested)
+    detection = seed
+    if detection is None and OCR_PAGE_SCRIPT_DETECTION:
+        try:
+            detection = run_detection_pass(page, engine)
+        except Exception as e:
+            print(f"OCR failed with {DETECTION_LANGS}, {DETECTION_CONFIG}: {e}")
+
+    attempts = []
+    if detection is not None:
+        page_text, _ = _text_and_confidence(detection["data"])
+        target = dominant_script(page_text, default=base_lang)
+        if target != base_lang:
+            candidates = _candidate_langs(target)
+        # Languages without a tag table (e.g. hin) keep every candidate
+        tags = SCRIPT_LANG_TAGS.get(target)
+        if tags:
+            candidates = [langs for langs in candidates if any(tag in langs for tag in tags)] or candidates
+        attempts.append((detection["langs"], detection["config"]))
+
+    # Block mode for every language first; single-line mode is a last resort
+    for cfg in configs:
+        for langs in candidates:
+            if (langs, cfg) not in attempts:
+                attempts.append((langs, cfg))
+
+    best_text = ""
+    best_score = -1.0
+
+    for langs, cfg in attempts:
+        if detection is not None and (langs, cfg) == (detection["langs"], detection["config"]):
+            data = detection["data"]
+        else:
+            try:
+                data = engine.image_to_data(page, lang=langs, config=cfg)
+            except Exception as e:
+                print(f"OCR failed with {langs}, {cfg}: {e}")
+                continue
+
+        txt, confidence = _text_and_confidence(data)
+        if not txt.strip():
+            continue
+        cleaned_txt = clean_ocr_text(txt, target_lang=target)
+        if not cleaned_txt.strip() or not is_reasonable_ocr_output(cleaned_txt, target_lang=target):
+            continue
+
+        coverage = script_coverage(cleaned_txt, target)
+        score = confidence * coverage
+        if score > best_score:
+            best_text = cleaned_txt
+            best_score = score
+        if confidence >= OCR_CONFIDENCE_THRESHOLD and coverage >= OCR_MIN_SCRIPT_COVERAGE:
+            break
+
+    return best_text
+
+
+def _text_and_confidence(data):
+    """
+    Rebuild line-broken text from an image_to_data dict and compute the mean
+    confidence of its recognised words.
+    """
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        word = (word or "").strip()
+        conf = float(data["conf"][i])
+        if not word or conf < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confidences.append(conf)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    mean_conf = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, mean_conf
+
+
+def script_coverage(text, target_lang="nep"):
+    """
+    Fraction of the letters in text that belong to the target language's
+    script. Languages without a script table count as fully covered.
+    """
+    pattern = SCRIPT_PATTERNS.get(target_lang.split("+")[0])
+    if pattern is None:
+        return 1.0
+    in_script = len(pattern.findall(text))
+    other_letters = sum(1 for c in text if c.isalpha() and not pattern.match(c))
+    total = in_script + other_letters
+    return in_script / total if total else 0.0
+
+
+def remove_repeated_characters(text):
+    """
+    Remove lines with excessive character repetition (OCR artifacts)
+    """
+    return drop_artifact_lines(text)
+
+
+def clean_ocr_text(text, target_lang="nep"):
+    """
+    Clean OCR output by removing unwanted characters and artifacts
+    (single pass per line, see normalizer.py)
+    """
+    return normalize_ocr_text(text, target_lang=target_lang)
+
+
+def is_reasonable_ocr_output(text, target_lang="nep"):
+    """
+    Check if OCR output looks reasonable for the target language
+    """
+    if target_lang in ["nep", "nepali"]:
+        # Should contain Devanagari characters
+        return DEVANAGARI.search(text) is not None
+    elif target_lang in ["sin", "sinhala"]:
+        # Should contain Sinhala characters
+        return SINHALA.search(text) is not None
+    
+    return True
+
+
+def _init_ocr_worker(thread_limit):
+    # Inherited by every tesseract subprocess pytesseract starts from this worker,
+    # and read by in-process tesserocr when its first API initializes OpenMP
+    os.environ["OMP_THREAD_LIMIT"] = str(thread_limit)
+
+
+def ocr_page_image(image, lang="nep", seed=None, engine=None):
+    """
+    OCR a single rasterized page (PIL image) with extract_text_from_image.
+    Module-level so it can be shipped to the page worker pool, where the
+    engine (and its initialized tesseract APIs) lives for the pool's lifetime.
+    """
+    return extract_text_from_image(image, lang=lang, seed=seed, engine=engine)
+
+
+def ocr_pages(images, lang="nep", workers=None, first_page_ocr=None, engine=None):
+    """
+    OCR an iterable of page images across a process pool.
+    Yields (page_number, text) in page order, starting at 1. At most
+    2 * workers pages are in flight at once. first_page_ocr (from
+    detect_document_language) is reused for page 1.
+    """
+    workers = workers or OCR_WORKERS
+    if workers <= 1:
+        for page_number, image in enumerate(images, start=1):
+            seed = first_page_ocr if page_number == 1 else None
+            yield page_number, ocr_page_image(image, lang, seed, engine)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                             initargs=(OCR_TESSERACT_THREADS,)) as pool:
+        pending = deque()
+        for page_number, image in enumerate(images, start=1):
+            seed = first_page_ocr if page_number == 1 else None
+            pending.append((page_number, pool.submit(ocr_page_image, image, lang, seed, engine)))
+            if len(pending) >= 2 * workers:
+                done_page, future = pending.popleft()
+                yield done_page, future.result()
+        while pending:
+            done_page, future = pending.popleft()
+            yield done_page, future.result()
@@ -0,0 +1,172 @@
+# ocr_engines.py - tesseract backends used by ocr.py
+#
+# Both engines take a page prepared by engine.page(image) and return
+# pytesseract-style results (image_to_data as an Output.DICT dict), so the
+# candidate sweep in ocr.py does not care which one runs.
+#   pytesseract - a tesseract subprocess per call, reloading the traineddata each time
+#   tesserocr   - in-process PyTessBaseAPI, one per language set per worker,
+#                 reused across pages (pip install tesserocr)
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # optional; pytesseract is the fallback
+    tesserocr = None
+
+# "auto" uses tesserocr when it is installed, else pytesseract
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+
+_TSV_INT_COLUMNS = ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                    "left", "top", "width", "height")
+
+
+class PytesseractEngine:
+    name = "pytesseract"
+
+    @contextmanager
+    def page(self, image):
+        """
+        Path tesseract can read for image (a path or PIL image). A PIL image is
+        written once as uncompressed PNM, cheaper than PNG's zlib round trip,
+        and the file is shared by every OCR pass over the page.
+        """
+        if isinstance(image, (str, os.PathLike)):
+            yield image
+            return
+        if image.mode not in ("1", "L", "RGB"):
+            image = image.convert("RGB")
+        tmp = tempfile.NamedTemporaryFile(suffix=".pnm", delete=False)
+        try:
+            image.save(tmp, format="PPM")
+            tmp.close()
+            yield tmp.name
+        finally:
+            tmp.close()
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+
+    def image_to_data(self, page, lang, config=""):
+        return pytesseract.image_to_data(page, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+    def image_to_string(self, page, lang, config=""):
+        return pytesseract.image_to_string(page, lang=lang, config=config)
+
+
+class TesserocrEngine:
+    """
+    In-process tesseract. Each worker keeps one initialized PyTessBaseAPI per
+    (languages, OEM) pair, so traineddata is loaded once instead of once per
+    call; the page segmentation mode is switched per call. APIs are not
+    thread-safe, so they are per thread as well as per process.
+    """
+    name = "tesserocr"
+
+    def __init__(self):
+        self._local = threading.local()
+        self._fallback = PytesseractEngine()
+
+    def _api(self, lang, oem):
+        apis = getattr(self._local, "apis", None)
+        if apis is None or self._local.pid != os.getpid():
+            # Never reuse an API inherited across fork
+            apis = self._local.apis = {}
+            self._local.pid = os.getpid()
+        api = apis.get((lang, oem))
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+            apis[(lang, oem)] = api
+        return api
+
+    @staticmethod
+    def _parse_config(config):
+        oem = re.search(r"--oem\s+(\d+)", config or "")
+        psm = re.search(r"--psm\s+(\d+)", config or "")
+        return (int(oem.group(1)) if oem else tesserocr.OEM.DEFAULT,
+                int(psm.group(1)) if psm else tesserocr.PSM.SINGLE_BLOCK)
+
+    @contextmanager
+    def page(self, image):
+        if isinstance(image, (str, os.PathLike)):
+            image = Image.open(image)
+        yield image
+
+    def _recognize(self, page, lang, config):
+        oem, psm = self._parse_config(config)
+        api = self._api(lang, oem)
+        api.SetPageSegMode(psm)
+        api.SetImage(page)
+        return api
+
+    def image_to_data(self, page, lang, config=""):
+        try:
+            api = self._recognize(page, lang, config)
+            api.Recognize()
+            tsv = api.GetTSVText(0)
+        except RuntimeError as e:
+            # e.g. traineddata missing for this language set
+            print(f"[ocr] tesserocr failed for {lang}, using pytesseract: {e}")
+            with self._fallback.page(page) as path:
+                return self._fallback.image_to_data(path, lang, config)
+        return _tsv_to_dict(tsv)
+
+    def image_to_string(self, page, lang, config=""):
+        try:
+            return self._recognize(page, lang, config).GetUTF8Text()
+        except RuntimeError as e:
+            print(f"[ocr] tesserocr failed for {lang}, using pytesseract: {e}")
+            with self._fallback.page(page) as path:
+                return self._fallback.image_to_string(path, lang, config)
+
+
+def _tsv_to_dict(tsv):
+    """tesseract TSV rows (no header) as pytesseract's image_to_data Output.DICT."""
+    columns = _TSV_INT_COLUMNS + ("conf", "text")
+    data = {column: [] for column in columns}
+    for row in tsv.splitlines():
+        fields = row.split("\t")
+        if len(fields) < len(columns) - 1:
+            continue
+        fields += [""] * (len(columns) - len(fields))
+        for column, value in zip(_TSV_INT_COLUMNS, fields):
+            data[column].append(int(value))
+        data["conf"].append(float(fields[10]))
+        data["text"].append(fields[11])
+    return data
+
+
+_ENGINES = {"pytesseract": PytesseractEngine, "tesserocr": TesserocrEngine}
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(name=None):
+    """
+    The OCR engine `name` ("tesserocr", "pytesseract" or "auto"; default
+    OCR_ENGINE), created once per process. Asking for tesserocr without the
+    package installed falls back to pytesseract.
+    """
+    requested = name or OCR_ENGINE
+    engine = _engines.get(requested)
+    if engine is not None:
+        return engine
+    name = requested
+    if name == "auto":
+        name = "tesserocr" if tesserocr is not None else "pytesseract"
+    if name == "tesserocr" and tesserocr is None:
+        print("[ocr] tesserocr is not installed, using pytesseract")
+        name = "pytesseract"
+    if name not in _ENGINES:
+        raise ValueError(f"Unknown OCR engine: {requested}")
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = _ENGINES[name]()
+        return _engines.setdefault(requested, _engines[name])
@@ -0,0 +1,59 @@
+# reaper.py - removes a deleted document's files on a background thread
+import os
+import glob
+import queue
+import threading
+
+_queue = queue.Queue()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def document_artifacts(document_id, directories):
+    """
+    Every file belonging to a document: the upload (<id>.<ext>) and anything
+    derived from it (<id>_original.pdf, _native.pdf, _english.pdf,
+    _download*.pdf, <id>.manifest.json, ...).
+    """
+    paths = []
+    for directory in directories:
+        for pattern in (f"{glob.escape(document_id)}.*", f"{glob.escape(document_id)}_*"):
+            paths.extend(glob.glob(os.path.join(directory, pattern)))
+    return sorted(set(paths))
+
+
+def _remove_artifacts(document_id, directories):
+    for path in document_artifacts(document_id, directories):
+        try:
+            os.remove(path)
+            print(f"[reaper] Deleted {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[reaper] Could not delete {path}: {e}")
+
+
+def _run():
+    while True:
+        document_id, directories = _queue.get()
+        try:
+            _remove_artifacts(document_id, directories)
+        except Exception as e:
+            print(f"[reaper] Failed to reap files of {document_id}: {e}")
+        finally:
+            _queue.task_done()
+
+
+def reap_document_files(document_id, directories):
+    """Queue removal of a document's files and return immediately."""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="file-reaper", daemon=True)
+            _thread.start()
+    _queue.put((document_id, list(directories)))
+
+
+def wait_for_reaper():
+    """Block until every queued removal has run (shutdown hooks, benchmarks)."""
+    _queue.join()
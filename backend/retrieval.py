@@ -0,0 +1,104 @@
+# retrieval.py - chunk translated documents into the vector store and retrieve chat context
+import os
+import re
+from typing import List, Optional
+from embeddings import create_embedding, create_embeddings, add_document, has_document, query
+
+# English characters per chunk; the native text of the page is split into
+# the same number of pieces so every chunk carries both languages.
+CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "1200"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+# Rough budget for the retrieved context in the chat prompt
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes per token holds for English and is conservative for
+    # Devanagari/Sinhala, whose characters are 3 bytes in UTF-8
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+def _split_into(text: str, parts: int) -> List[str]:
+    """Split text into `parts` pieces of similar length, at whitespace where possible."""
+    text = text.strip()
+    if parts <= 1 or not text:
+        return [text] + [""] * (parts - 1)
+    pieces = []
+    start = 0
+    for i in range(1, parts):
+        cut = round(len(text) * i / parts)
+        space = text.rfind(" ", start, cut + 1)
+        if space > start:
+            cut = space
+        pieces.append(text[start:cut].strip())
+        start = cut
+    pieces.append(text[start:].strip())
+    return pieces
+
+
+def chunk_pages(native_texts: List[str], translated_texts: List[str]) -> List[dict]:
+    """
+    Page-aligned chunks: each page's English text is cut into ~CHUNK_CHARS
+    pieces and its native text into the same number of pieces.
+    """
+    chunks = []
+    for page, (native, translated) in enumerate(zip(native_texts, translated_texts), start=1):
+        native, translated = native or "", translated or ""
+        if not translated.strip() and not native.strip():
+            continue
+        parts = max(1, -(-len(translated.strip()) // CHUNK_CHARS))
+        for part, (native_piece, translated_piece) in enumerate(
+                zip(_split_into(native, parts), _split_into(translated, parts)), start=1):
+            chunks.append({
+                "id": f"p{page}-{part}",
+                "page": page,
+                "text": re.sub(r"\s+", " ", translated_piece),
+                "native": re.sub(r"\s+", " ", native_piece),
+            })
+    return chunks
+
+
+def index_document(document_id: str, name: str, native_texts: List[str], translated_texts: List[str]) -> int:
+    """Chunk, embed and store a document's pages. Returns the number of chunks indexed."""
+    chunks = chunk_pages(native_texts, translated_texts)
+    vectors = create_embeddings([chunk["text"] or chunk["native"] for chunk in chunks])
+    for chunk, vector in zip(chunks, vectors):
+        chunk["embedding"] = vector
+    add_document(document_id, name, chunks)
+    print(f"[rag] Indexed {len(chunks)} chunks for document {document_id}")
+    return len(chunks)
+
+
+def index_translations(document_id: str, name: str, translations: List[dict]) -> int:
+    """index_document for rows as returned by get_translations_for_document."""
+    return index_document(
+        document_id,
+        name,
+        [t.get("original_text") or "" for t in translations],
+        [t.get("translated_text") or "" for t in translations],
+    )
+
+
+def retrieve_context(document_id: str, question: str, top_k: Optional[int] = None,
+                     token_budget: Optional[int] = None) -> Optional[str]:
+    """
+    Chat context from the chunks most similar to the question, in both
+    languages, kept in page order and cut off at the token budget.
+    Returns None when the document is not indexed.
+    """
+    if not has_document(document_id):
+        return None
+    budget = token_budget or RAG_CONTEXT_TOKENS
+    hits = query(document_id, create_embedding(question), top_k=top_k or RAG_TOP_K)
+
+    selected, used = [], 0
+    for hit in hits:  # best first, so the budget drops the weakest matches
+        block = f"[Page {hit.get('page')}]\nOriginal text: {hit.get('native') or ''}\nEnglish translation: {hit['text']}"
+        cost = estimate_tokens(block)
+        if selected and used + cost > budget:
+            break
+        selected.append((hit.get("page") or 0, block))
+        used += cost
+    selected.sort(key=lambda item: item[0])  # page order reads better than score order
+    print(f"[rag] Retrieved {len(selected)} chunks (~{used} tokens) for document {document_id}")
+    return "\n\n".join(block for _, block in selected)
@@ -1,6 +1,9 @@
 from supabase import create_client, Client
 import os
+import time
+import uuid
 from dotenv import load_dotenv
+from cache import TTLLRUCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -8,7 +11,51 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Without credentials the module still imports (local runs, benchmarks) and
+# sb_available() reports the database as unavailable.
+if SUPABASE_URL and SUPABASE_KEY:
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+else:
+    print("[supabase] SUPABASE_URL / SUPABASE_KEY not set; database features are disabled")
+    supabase = None
+
+# Bulk translation writes: rows and payload bytes per insert request, and how
+# many times a failed batch is retried before giving up on it.
+INSERT_BATCH_ROWS = int(os.getenv("SUPABASE_INSERT_BATCH_ROWS", "500"))
+INSERT_BATCH_BYTES = int(os.getenv("SUPABASE_INSERT_BATCH_BYTES", str(4 * 1024 * 1024)))
+WRITE_RETRIES = int(os.getenv("SUPABASE_WRITE_RETRIES", "3"))
+
+
+def _document_cache_sizeof(value):
+    # Text dominates: sum the string fields of a row or a list of rows
+    rows = value if isinstance(value, list) else [value]
+    return 256 + sum(len(str(v)) for row in rows for v in row.values())
+
+
+# Read-through cache for document rows and their ordered page translations,
+# which /metadata, /chat, /download/pdf and /debug/translations re-read.
+# Only found documents are cached, so a read racing an upload is not pinned.
+# Invalidation only reaches the calling process: other gunicorn workers can
+# keep serving a deleted or re-written document for up to DOCUMENT_CACHE_TTL.
+document_cache = TTLLRUCache(
+    max_bytes=int(os.getenv("DOCUMENT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    ttl=float(os.getenv("DOCUMENT_CACHE_TTL", "300")),
+    sizeof=_document_cache_sizeof,
+)
+
+
+# chat_id per (user_id, document_id). A chat never moves to another user or
+# document, so an entry only goes stale when the document is deleted.
+chat_id_cache = TTLLRUCache(
+    max_bytes=4 * 1024 * 1024,
+    ttl=float(os.getenv("CHAT_ID_CACHE_TTL", "3600")),
+    sizeof=lambda chat_id: 160,
+)
+
+
+def invalidate_document(document_id):
+    """Drop a document's cached metadata and translations (after it is written or deleted)."""
+    document_cache.invalidate(("metadata", document_id), ("translations", document_id))
 
 
 def sb_available():
@@ -45,51 +92,152 @@ def insert_translation(document_id, original_text, translated_text, page_number)
         return None
 
 
-def get_translations_for_document(document_id):
+def _execute_with_retries(label, build, before_retry=None):
+    """build().execute(), retried with back-off; before_retry() undoes a possibly partial write."""
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            if attempt and before_retry:
+                before_retry()
+            return build().execute()
+        except Exception as e:
+            if attempt == WRITE_RETRIES:
+                raise
+            delay = 0.5 * 2 ** attempt
+            print(f"[supabase] {label} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _translation_batches(rows):
+    batches, batch, size = [], [], 0
+    for row in rows:
+        row_size = len((row["original_text"] + row["translated_text"]).encode("utf-8")) + 128
+        if batch and (len(batch) >= INSERT_BATCH_ROWS or size + row_size > INSERT_BATCH_BYTES):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def insert_translations_bulk(document_id, pages, document=None):
+    """
+    Write a document's page translations in as few requests as possible.
+    pages: list of {original_text, translated_text, page_number}.
+    document: optional documents row (user_id, title, file_url, language,
+    page_count) written first, so the pages never exist without it.
+    Each batch is retried on its own; returns True if every write succeeded.
+    """
+    invalidate_document(document_id)
     try:
-        res = supabase.table("translations").select("*").eq("document_id", document_id).order("page_number").execute()
+        if document is not None:
+            _execute_with_retries(
+                "insert_document",
+                # Upsert, so a retry after a lost response is not a duplicate key
+                lambda: supabase.table("documents").upsert({"document_id": document_id, **document}),
+            )
+    except Exception as e:
+        print("[supabase] insert_translations_bulk document exception:", e)
+        return False
+
+    rows = [{
+        "document_id": document_id,
+        "original_text": page.get("original_text") or "",
+        "translated_text": page.get("translated_text") or "",
+        "page_number": page["page_number"],
+    } for page in pages]
+    ok = True
+    for batch in _translation_batches(rows):
+        numbers = [row["page_number"] for row in batch]
+        try:
+            _execute_with_retries(
+                f"insert_translations pages {numbers[0]}-{numbers[-1]}",
+                lambda: supabase.table("translations").insert(batch),
+                # The failed attempt may have landed server-side; clear it so the retry does not duplicate pages
+                before_retry=lambda: supabase.table("translations").delete()
+                .eq("document_id", document_id).in_("page_number", numbers).execute(),
+            )
+        except Exception as e:
+            print(f"[supabase] insert_translations_bulk pages {numbers[0]}-{numbers[-1]} exception:", e)
+            ok = False
+    invalidate_document(document_id)
+    return ok
+
+
+def get_translations_for_document(document_id, first_page=None, last_page=None):
+    """
+    Translation rows in page order. first_page/last_page (inclusive) select a
+    page window with a ranged query, or a slice of the cached document when
+    the whole document is already cached; only whole documents are cached.
+    """
+    ranged = first_page is not None or last_page is not None
+    cached = document_cache.get(("translations", document_id))
+    if cached is not None:
+        if not ranged:
+            return cached
+        return [t for t in cached
+                if (first_page is None or t["page_number"] >= first_page)
+                and (last_page is None or t["page_number"] <= last_page)]
+    try:
+        query = supabase.table("translations").select("*").eq("document_id", document_id)
+        if first_page is not None:
+            query = query.gte("page_number", first_page)
+        if last_page is not None:
+            query = query.lte("page_number", last_page)
+        res = query.order("page_number").execute()
+        if res.data and not ranged:
+            document_cache.put(("translations", document_id), res.data)
         return res.data
     except Exception as e:
         print("[supabase] get_translations_for_document exception:", e)
         return []
 
 
-def get_document_metadata(document_id):
+def get_document_metadata(document_id, fresh=False):
+    """The document row; fresh=True skips the cache and reads the database."""
+    cached = None if fresh else document_cache.get(("metadata", document_id))
+    if cached is not None:
+        return cached
     try:
         res = supabase.table("documents").select("*").eq("document_id", document_id).maybe_single().execute()
-        return res.data
+        if res and res.data:
+            document_cache.put(("metadata", document_id), res.data)
+        return res.data if res else None
     except Exception as e:
         print("[supabase] get_document_metadata exception:", e)
         return None
 
 
+def _new_chat_id(user_id, document_id):
+    # Deterministic, so concurrent first messages (other threads/workers) create the same row
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"linguabridge:chat:{user_id}:{document_id}"))
+
+
 def get_or_create_chat(document_id, user_id):
+    """
+    chat_id for the user's chat on a document, creating the chat on first use.
+    Served from chat_id_cache after the first call; creation is an
+    ignore-duplicates upsert, so a racing creator cannot make a second chat.
+    """
+    key = (user_id, document_id)
+    chat_id = chat_id_cache.get(key)
+    if chat_id:
+        return chat_id
     try:
-        print(f"[supabase] Attempting to create/get chat for doc={document_id}, user={user_id}")
-        
-        # Try to get existing chat for user and document
-        res = supabase.table("chats").select("*")\
-            .eq("document_id", document_id).eq("user_id", user_id).maybe_single().execute()
-        
-        print(f"[supabase] Existing chat query result: {res}")
-        
-        if res and hasattr(res, 'data') and res.data:
-            return res.data["chat_id"]
-        
-        # Create new chat session
-        from uuid import uuid4
-        chat_id = str(uuid4())
-        
-        chat_data = {
-            "chat_id": chat_id,
-            "document_id": document_id,
-            "user_id": user_id,
-        }
-        print(f"[supabase] Creating new chat with data: {chat_data}")
-        
-        res_insert = supabase.table("chats").insert(chat_data).execute()
-        print(f"[supabase] Chat creation result: {res_insert.data}")
-        
+        res = supabase.table("chats").select("chat_id")\
+            .eq("document_id", document_id).eq("user_id", user_id).limit(1).execute()
+        if res.data:
+            chat_id = res.data[0]["chat_id"]
+        else:
+            chat_id = _new_chat_id(user_id, document_id)
+            supabase.table("chats").upsert(
+                {"chat_id": chat_id, "document_id": document_id, "user_id": user_id},
+                on_conflict="chat_id",
+                ignore_duplicates=True,
+            ).execute()
+            print(f"[supabase] Created chat {chat_id} for doc={document_id}, user={user_id}")
+        chat_id_cache.put(key, chat_id)
         return chat_id
     except Exception as e:
         print(f"[supabase] get_or_create_chat exception: {e}")
@@ -111,6 +259,20 @@ def insert_message(chat_id, role, content):
         return None
 
 
+def insert_messages(chat_id, messages):
+    """
+    Insert several messages in one request.
+    messages: list of {role, content} plus an optional created_at, which
+    keeps rows written by the same statement in conversation order.
+    """
+    try:
+        res = supabase.table("messages").insert([{"chat_id": chat_id, **m} for m in messages]).execute()
+        return res.data
+    except Exception as e:
+        print("[supabase] insert_messages exception:", e)
+        return None
+
+
 def get_user_documents(user_id):
     """Get all documents for a specific user"""
     try:
@@ -133,75 +295,48 @@ def get_chat_messages(chat_id):
 
 def get_user_chat_for_document(user_id, document_id):
     """Get chat ID for a user's document, create if doesn't exist"""
-    try:
-        print(f"[supabase] get_user_chat_for_document: user_id={user_id}, document_id={document_id}")
-        
-        # Try to get existing chat
-        res = supabase.table("chats").select("*").eq("user_id", user_id).eq("document_id", document_id).maybe_single().execute()
-        
-        print(f"[supabase] Existing chat query result: {res}")
-        
-        if res and hasattr(res, 'data') and res.data:
-            print(f"[supabase] Found existing chat: {res.data}")
-            return res.data["chat_id"]
-        
-        # Create new chat if doesn't exist
-        from uuid import uuid4
-        chat_id = str(uuid4())
-        
-        chat_data = {
-            "chat_id": chat_id,
-            "user_id": user_id,
-            "document_id": document_id,
-        }
-        
-        print(f"[supabase] Creating new chat with data: {chat_data}")
-        
-        res_insert = supabase.table("chats").insert(chat_data).execute()
-        print(f"[supabase] Chat creation result: {res_insert}")
-        
-        return chat_id
-    except Exception as e:
-        print(f"[supabase] get_user_chat_for_document exception: {e}")
-        import traceback
-        print(f"[supabase] Full traceback: {traceback.format_exc()}")
-        return None
+    return get_or_create_chat(document_id, user_id)
+
+
+# Chat ids per messages delete request, to keep the in.(...) filter well inside URL limits
+DELETE_BATCH_IDS = 200
 
 
 def delete_user_document(user_id, document_id):
-    """Delete a document and all related data for a specific user"""
+    """
+    Delete a document and all related data for a specific user. Set-based:
+    a fixed number of requests however many chats and messages it has.
+    """
     try:
         print(f"[supabase] delete_user_document: user_id={user_id}, document_id={document_id}")
         
         # First, verify the document belongs to the user
-        doc_res = supabase.table("documents").select("*").eq("document_id", document_id).eq("user_id", user_id).maybe_single().execute()
+        doc_res = supabase.table("documents").select("document_id")\
+            .eq("document_id", document_id).eq("user_id", user_id).limit(1).execute()
         
         if not doc_res.data:
             print(f"[supabase] Document {document_id} not found or doesn't belong to user {user_id}")
             return False
         
-        # Delete translations for this document
-        translations_res = supabase.table("translations").delete().eq("document_id", document_id).execute()
-        print(f"[supabase] Deleted translations: {translations_res}")
-        
-        # Delete chat messages for this document (if chats table exists)
+        # Messages of every chat on the document in one in.(...) delete, then the chats
         try:
-            chats_res = supabase.table("chats").select("chat_id").eq("document_id", document_id).eq("user_id", user_id).execute()
-            if chats_res.data:
-                for chat in chats_res.data:
-                    chat_id = chat["chat_id"]
-                    messages_res = supabase.table("messages").delete().eq("chat_id", chat_id).execute()
-                    print(f"[supabase] Deleted messages for chat {chat_id}: {messages_res}")
-                
-                # Delete the chat record
-                chat_delete_res = supabase.table("chats").delete().eq("document_id", document_id).eq("user_id", user_id).execute()
-                print(f"[supabase] Deleted chat records: {chat_delete_res}")
+            chats_res = supabase.table("chats").select("chat_id").eq("document_id", document_id).execute()
+            chat_ids = [chat["chat_id"] for chat in chats_res.data or []]
+            for i in range(0, len(chat_ids), DELETE_BATCH_IDS):
+                supabase.table("messages").delete(returning="minimal")\
+                    .in_("chat_id", chat_ids[i:i + DELETE_BATCH_IDS]).execute()
+            if chat_ids:
+                supabase.table("chats").delete(returning="minimal").eq("document_id", document_id).execute()
+            print(f"[supabase] Deleted {len(chat_ids)} chats and their messages")
         except Exception as chat_error:
             print(f"[supabase] Chat deletion failed (table might not exist): {chat_error}")
         
-        # Finally, delete the document record
-        doc_delete_res = supabase.table("documents").delete().eq("document_id", document_id).eq("user_id", user_id).execute()
-        print(f"[supabase] Deleted document: {doc_delete_res}")
+        supabase.table("translations").delete(returning="minimal").eq("document_id", document_id).execute()
+        supabase.table("documents").delete(returning="minimal")\
+            .eq("document_id", document_id).eq("user_id", user_id).execute()
+        print(f"[supabase] Deleted document {document_id} and its translations")
+        invalidate_document(document_id)
+        chat_id_cache.invalidate((user_id, document_id))
         
         return True
     except Exception as e:
@@ -209,4 +344,3 @@ def delete_user_document(user_id, document_id):
         import traceback
         print(f"[supabase] Full traceback: {traceback.format_exc()}")
         return False
-
@@ -2,48 +2,279 @@
 """Translate module using OpenAI Chat Completions API (modern SDK)."""
 
 import os
-from openai import OpenAI
+import re
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, InternalServerError
+from cache import SQLiteLRUCache, cache_key
+
+TRANSLATION_SYSTEM_PROMPT = "You are a translation assistant."
+TRANSLATION_PROMPT = (
+    "You are an expert translator specializing in OCR text correction and translation. "
+    "Input is text extracted from scanned documents in Nepali or Sinhala (or both). "
+    "The text may contain OCR noise, repeated characters, or garbled text. "
+    "Your task:\n"
+    "1. First, clean and correct any obvious OCR errors\n"
+    "2. Then translate the corrected text to clear, natural English\n"
+    "3. Preserve the original meaning and context\n"
+    "4. Return ONLY the final English translation\n\n"
+    "OCR Text to translate:\n---\n{source_text}\n---\n\n"
+    "Provide clean English translation:"
+)
+# Several short pages in one request; each page is wrapped in these markers
+# and the model must echo them so the reply can be split back per page.
+TRANSLATION_BATCH_PROMPT = (
+    "You are an expert translator specializing in OCR text correction and translation. "
+    "Input is text extracted from scanned documents in Nepali or Sinhala (or both). "
+    "The text may contain OCR noise, repeated characters, or garbled text. "
+    "It is split into pages, each between <<<PAGE n>>> and <<<END PAGE n>>> markers.\n"
+    "Your task, for every page separately:\n"
+    "1. First, clean and correct any obvious OCR errors\n"
+    "2. Then translate the corrected text to clear, natural English\n"
+    "3. Preserve the original meaning and context\n"
+    "4. Return ONLY the English translation of each page, wrapped in the same "
+    "<<<PAGE n>>> and <<<END PAGE n>>> markers, in the same order\n\n"
+    "OCR pages to translate:\n{pages}\n\n"
+    "Provide clean English translations:"
+)
+_PAGE_BLOCK = re.compile(r"<<<PAGE (\d+)>>>\s*(.*?)\s*<<<END PAGE \1>>>", re.DOTALL)
+
+# Part of every translation cache key: editing any prompt changes the
+# version, so old translations stop matching (purge_stale_translations()
+# reclaims their space).
+PROMPT_VERSION = hashlib.sha256(
+    "\0".join([TRANSLATION_SYSTEM_PROMPT, TRANSLATION_PROMPT, TRANSLATION_BATCH_PROMPT]).encode("utf-8")
+).hexdigest()[:12]
+
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+TRANSLATION_CACHE_ENABLED = os.getenv("TRANSLATION_CACHE", "1") == "1"
+translation_cache = SQLiteLRUCache(
+    os.path.join(DATA_DIR, "translation_cache.sqlite3"),
+    max_bytes=int(os.getenv("TRANSLATION_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
+# Document translation: requests in flight at once, and how short pages are
+# packed into shared requests.
+TRANSLATION_MAX_IN_FLIGHT = int(os.getenv("TRANSLATION_MAX_IN_FLIGHT", "4"))
+TRANSLATION_BATCH_CHARS = int(os.getenv("TRANSLATION_BATCH_CHARS", "2000"))
+TRANSLATION_BATCH_MAX_PAGES = int(os.getenv("TRANSLATION_BATCH_MAX_PAGES", "8"))
+SOURCE_TEXT_LIMIT = 16000
+
+# HTTP and retry policy for every OpenAI call (translation, chat and embeddings,
+# sync and async). The SDK's own retries are off: _call_with_retries and
+# _create_completion_async retry
+# 429s through the shared rate-limit gate and transient network/5xx errors
+# with a short exponential back-off.
+OPENAI_TIMEOUT = httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", "60")),
+                               connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10")))
+OPENAI_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "10")),
+    keepalive_expiry=60.0,
+)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "6"))
+
+
+def purge_stale_translations() -> int:
+    """Drop cached translations made with an older prompt version."""
+    return translation_cache.purge(keep_version=PROMPT_VERSION)
+
+
+class _OpenAIClients:
+    """
+    Process-wide OpenAI clients on tuned httpx pools, so TLS sessions and
+    keep-alive connections are reused across calls. The sync client is
+    rebuilt after a fork (pool processes must not share sockets); async
+    clients are kept per event loop, since httpx connections belong to the
+    loop that opened them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync = None
+        self._sync_pid = None
+        self._async = weakref.WeakKeyDictionary()
+
+    def sync(self) -> OpenAI:
+        if self._sync is None or self._sync_pid != os.getpid():
+            with self._lock:
+                if self._sync is None or self._sync_pid != os.getpid():
+                    # OPENAI_API_KEY must be in environment; app loads .env before imports
+                    self._sync = OpenAI(
+                        timeout=OPENAI_TIMEOUT,
+                        max_retries=0,
+                        http_client=httpx.Client(timeout=OPENAI_TIMEOUT, limits=OPENAI_POOL_LIMITS),
+                    )
+                    self._sync_pid = os.getpid()
+        return self._sync
+
+    def async_(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        client = self._async.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                timeout=OPENAI_TIMEOUT,
+                max_retries=0,
+                http_client=httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=OPENAI_POOL_LIMITS),
+            )
+            self._async[loop] = client
+        return client
+
+
+_clients = _OpenAIClients()
+
 
 def _get_openai_client() -> OpenAI:
-    # OPENAI_API_KEY must be in environment; app loads .env before imports
-    return OpenAI()
+    return _clients.sync()
 
-def translate_text_to_english(source_text: str, max_tokens: int = 1200, model: str = "gpt-4o-mini") -> str:
+
+def _get_async_openai_client() -> AsyncOpenAI:
+    return _clients.async_()
+
+
+class _RateLimitGate:
     """
-    Calls OpenAI to translate possibly noisy OCR output into clean English.
-    Returns the translated text (string). Prototype-safe with model fallbacks.
+    Process-wide pause shared by all translation threads: when one request
+    gets a 429, every request waits out the same back-off window instead of
+    hammering the exhausted tokens/requests-per-minute budget.
     """
-    if not source_text or not source_text.strip():
-        return ""
 
-    prompt = (
-        "You are an expert translator specializing in OCR text correction and translation. "
-        "Input is text extracted from scanned documents in Nepali or Sinhala (or both). "
-        "The text may contain OCR noise, repeated characters, or garbled text. "
-        "Your task:\n"
-        "1. First, clean and correct any obvious OCR errors\n"
-        "2. Then translate the corrected text to clear, natural English\n"
-        "3. Preserve the original meaning and context\n"
-        "4. Return ONLY the final English translation\n\n"
-        f"OCR Text to translate:\n---\n{source_text[:16000]}\n---\n\n"
-        "Provide clean English translation:"
-    )
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+_rate_limit_gate = _RateLimitGate()
+
+
+def _retry_after_seconds(error: RateLimitError, attempt: int) -> float:
+    # Honour the server's hint when there is one, else exponential back-off with jitter
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(header)
+        if not value:
+            continue
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s)?", value.strip())
+        if match:
+            seconds = float(match.group(1))
+            return seconds / 1000 if match.group(2) == "ms" else seconds
+    return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying after error, or None to give up."""
+    if isinstance(error, RateLimitError):
+        return _retry_after_seconds(error, attempt) if attempt < RATE_LIMIT_MAX_RETRIES else None
+    if isinstance(error, (APIConnectionError, InternalServerError)):  # includes timeouts
+        return min(8.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.25) if attempt < OPENAI_MAX_RETRIES else None
+    return None
+
+
+def _log_retry(error: Exception, model: str | None, delay: float):
+    reason = "Rate limited" if isinstance(error, RateLimitError) else f"Transient error ({type(error).__name__})"
+    print(f"[translate] {reason} on {model}, backing off {delay:.1f}s")
+
+
+def _call_with_retries(create, **kwargs):
+    """create(**kwargs) with the shared retry policy (429s wait on the process-wide gate)."""
+    attempt = 0
+    while True:
+        _rate_limit_gate.wait()
+        try:
+            return create(**kwargs)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _log_retry(e, kwargs.get("model"), delay)
+            if isinstance(e, RateLimitError):
+                _rate_limit_gate.pause(delay)
+            else:
+                time.sleep(delay)
+
+
+def _create_completion(client: OpenAI, **kwargs):
+    """chat.completions.create with the shared retry policy."""
+    return _call_with_retries(client.chat.completions.create, **kwargs)
+
+
+def _create_embeddings(client: OpenAI, **kwargs):
+    """embeddings.create with the shared retry policy."""
+    return _call_with_retries(client.embeddings.create, **kwargs)
+
+
+async def _create_completion_async(client: AsyncOpenAI, **kwargs):
+    """Async twin of _create_completion."""
+    attempt = 0
+    while True:
+        await _rate_limit_gate.wait_async()
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            _log_retry(e, kwargs.get("model"), delay)
+            if isinstance(e, RateLimitError):
+                _rate_limit_gate.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+
+
+def _prepare_source(source_text: str) -> str:
+    return source_text.strip()[:SOURCE_TEXT_LIMIT]
+
+
+def _translation_key(source_text: str, model: str, max_tokens: int) -> str:
+    return cache_key(PROMPT_VERSION, model, max_tokens, source_text)
+
+
+CANDIDATE_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4o-2024-08-06", "gpt-3.5-turbo-0125"]
+
+
+def _candidate_models(model: str) -> list[str]:
+    return [model] + CANDIDATE_MODELS
+
+
+def _translation_request(prompt: str, max_tokens: int) -> dict:
+    return {
+        "messages": [
+            {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.0,
+        "max_tokens": max_tokens,
+    }
 
-    client = _get_openai_client()
 
-    candidate_models = [model, "gpt-4o", "gpt-4o-mini", "gpt-4o-2024-08-06", "gpt-3.5-turbo-0125"]
+def _complete_with_fallbacks(client: OpenAI, prompt: str, max_tokens: int, model: str) -> str:
     last_error: Exception | None = None
-    for m in candidate_models:
+    for m in _candidate_models(model):
         try:
-            resp = client.chat.completions.create(
-                model=m,
-                messages=[
-                    {"role": "system", "content": "You are a translation assistant."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.0,
-                max_tokens=max_tokens,
-            )
+            resp = _create_completion(client, model=m, **_translation_request(prompt, max_tokens))
             content = (resp.choices[0].message.content or "").strip()
             if content:
                 return content
@@ -56,14 +287,161 @@ def translate_text_to_english(source_text: str, max_tokens: int = 1200, model: s
     return ""
 
 
-def generate_chat_response(user_message: str, document_context: str, max_tokens: int = 800, model: str = "gpt-4o-mini") -> str:
+async def _complete_with_fallbacks_async(client: AsyncOpenAI, prompt: str, max_tokens: int, model: str) -> str:
+    last_error: Exception | None = None
+    for m in _candidate_models(model):
+        try:
+            resp = await _create_completion_async(client, model=m, **_translation_request(prompt, max_tokens))
+            content = (resp.choices[0].message.content or "").strip()
+            if content:
+                return content
+        except Exception as e:
+            last_error = e
+            continue
+
+    if last_error:
+        raise last_error
+    return ""
+
+
+def translate_text_to_english(source_text: str, max_tokens: int = 1200, model: str = "gpt-4o-mini") -> str:
     """
-    Generate an intelligent chat response based on document context and user question.
+    Calls OpenAI to translate possibly noisy OCR output into clean English.
+    Returns the translated text (string). Prototype-safe with model fallbacks.
+    Results are cached by (source text, model, prompt version).
     """
-    if not user_message.strip():
-        return "Please ask me a question about the document!"
-    
-    system_prompt = """You are a helpful AI assistant that answers questions based on document content. 
+    if not source_text or not source_text.strip():
+        return ""
+
+    source_text = _prepare_source(source_text)
+    key = _translation_key(source_text, model, max_tokens)
+    if TRANSLATION_CACHE_ENABLED:
+        cached = translation_cache.get(key)
+        if cached is not None:
+            return cached
+
+    prompt = TRANSLATION_PROMPT.format(source_text=source_text)
+    content = _complete_with_fallbacks(_get_openai_client(), prompt, max_tokens, model)
+    if content and TRANSLATION_CACHE_ENABLED:
+        translation_cache.put(key, content, version=PROMPT_VERSION)
+    return content
+
+
+async def translate_text_to_english_async(source_text: str, max_tokens: int = 1200, model: str = "gpt-4o-mini") -> str:
+    """Async variant of translate_text_to_english (same cache, same retry policy)."""
+    if not source_text or not source_text.strip():
+        return ""
+
+    source_text = _prepare_source(source_text)
+    key = _translation_key(source_text, model, max_tokens)
+    if TRANSLATION_CACHE_ENABLED:
+        cached = await asyncio.to_thread(translation_cache.get, key)
+        if cached is not None:
+            return cached
+
+    prompt = TRANSLATION_PROMPT.format(source_text=source_text)
+    content = await _complete_with_fallbacks_async(_get_async_openai_client(), prompt, max_tokens, model)
+    if content and TRANSLATION_CACHE_ENABLED:
+        await asyncio.to_thread(translation_cache.put, key, content, PROMPT_VERSION)
+    return content
+
+
+def _translate_batch(sources: list[str], max_tokens: int, model: str) -> list[str] | None:
+    """
+    Translate several short pages in one request. Returns one translation per
+    page, or None when the reply cannot be split back into every page.
+    """
+    pages = "\n".join(
+        f"<<<PAGE {n}>>>\n{text}\n<<<END PAGE {n}>>>" for n, text in enumerate(sources, start=1)
+    )
+    prompt = TRANSLATION_BATCH_PROMPT.format(pages=pages)
+    reply = _complete_with_fallbacks(_get_openai_client(), prompt, min(4096, max_tokens * len(sources)), model)
+    blocks = {int(n): text.strip() for n, text in _PAGE_BLOCK.findall(reply)}
+    if sorted(blocks) != list(range(1, len(sources) + 1)):
+        return None
+    return [blocks[n] for n in range(1, len(sources) + 1)]
+
+
+def _translate_unit(unit, max_tokens: int, model: str):
+    """Translate one scheduling unit (a long page or a pack of short ones)."""
+    if len(unit) > 1:
+        translated = _translate_batch([src for _, src in unit], max_tokens, model)
+        if translated is not None:
+            if TRANSLATION_CACHE_ENABLED:
+                for (_, src), text in zip(unit, translated):
+                    translation_cache.put(_translation_key(src, model, max_tokens), text, version=PROMPT_VERSION)
+            return [(i, text) for (i, _), text in zip(unit, translated)]
+        print(f"[translate] Could not split batched reply for {len(unit)} pages, translating them one by one")
+    results = []
+    for i, src in unit:
+        content = _complete_with_fallbacks(_get_openai_client(), TRANSLATION_PROMPT.format(source_text=src), max_tokens, model)
+        if content and TRANSLATION_CACHE_ENABLED:
+            translation_cache.put(_translation_key(src, model, max_tokens), content, version=PROMPT_VERSION)
+        results.append((i, content))
+    return results
+
+
+def _pack_pages(pages):
+    """
+    Group (index, text) pages into scheduling units: pages under
+    TRANSLATION_BATCH_CHARS share a request with their short neighbours (in
+    order, up to the char and page budget); longer pages go alone.
+    """
+    units = []
+    batch, batch_chars = [], 0
+    for i, text in pages:
+        if len(text) >= TRANSLATION_BATCH_CHARS:
+            units.append([(i, text)])
+            continue
+        if batch and (batch_chars + len(text) > TRANSLATION_BATCH_CHARS or len(batch) >= TRANSLATION_BATCH_MAX_PAGES):
+            units.append(batch)
+            batch, batch_chars = [], 0
+        batch.append((i, text))
+        batch_chars += len(text)
+    if batch:
+        units.append(batch)
+    return units
+
+
+def translate_pages(texts: list[str], max_in_flight: int | None = None, max_tokens: int = 1200,
+                    model: str = "gpt-4o-mini", on_page_done=None) -> list[str]:
+    """
+    Translate a document's pages concurrently, keeping page order.
+    Cached pages are served locally; short pages are packed into shared
+    requests; at most max_in_flight (TRANSLATION_MAX_IN_FLIGHT) requests
+    run at once. on_page_done(count) is called as translations complete.
+    """
+    results = [""] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        src = _prepare_source(text)
+        cached = translation_cache.get(_translation_key(src, model, max_tokens)) if TRANSLATION_CACHE_ENABLED else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append((i, src))
+
+    done = len(texts) - len(pending)
+    if on_page_done:
+        on_page_done(done)
+    if not pending:
+        return results
+
+    units = _pack_pages(pending)
+    with ThreadPoolExecutor(max_workers=max_in_flight or TRANSLATION_MAX_IN_FLIGHT) as pool:
+        futures = [pool.submit(_translate_unit, unit, max_tokens, model) for unit in units]
+        for future in as_completed(futures):
+            for i, text in future.result():
+                results[i] = text
+                done += 1
+            if on_page_done:
+                on_page_done(done)
+    return results
+
+
+CHAT_SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on document content. 
 
 Rules:
 - Answer ONLY based on the provided document context
@@ -74,6 +452,15 @@ Rules:
 
 Document content will be provided with both original text and English translations."""
 
+EMPTY_QUESTION_REPLY = "Please ask me a question about the document!"
+NO_ANSWER_REPLY = "I'm having trouble understanding your question. Could you please rephrase it?"
+
+
+def _chat_failure_reply(user_message: str) -> str:
+    return f"I understand you're asking about: '{user_message}'. However, I'm having trouble processing your request right now. Please try rephrasing your question."
+
+
+def _chat_request(user_message: str, document_context: str, max_tokens: int) -> dict:
     user_prompt = f"""Document context:
 {document_context}
 
@@ -81,22 +468,30 @@ User question: {user_message}
 
 Please provide a helpful response based on the document content above. If the question cannot be answered from the document, please let me know."""
 
+    return {
+        "messages": [
+            {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+    }
+
+
+def generate_chat_response(user_message: str, document_context: str, max_tokens: int = 800, model: str = "gpt-4o-mini") -> str:
+    """
+    Generate an intelligent chat response based on document context and user question.
+    """
+    if not user_message.strip():
+        return EMPTY_QUESTION_REPLY
+
     client = _get_openai_client()
-    
-    candidate_models = [model, "gpt-4o", "gpt-4o-mini", "gpt-4o-2024-08-06", "gpt-3.5-turbo-0125"]
+    request = _chat_request(user_message, document_context, max_tokens)
     last_error: Exception | None = None
     
-    for m in candidate_models:
+    for m in _candidate_models(model):
         try:
-            resp = client.chat.completions.create(
-                model=m,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.3,
-                max_tokens=max_tokens,
-            )
+            resp = _create_completion(client, model=m, **request)
             content = (resp.choices[0].message.content or "").strip()
             if content:
                 return content
@@ -106,6 +501,74 @@ Please provide a helpful response based on the document content above. If the qu
     
     if last_error:
         print(f"Chat generation failed: {last_error}")
-        return f"I understand you're asking about: '{user_message}'. However, I'm having trouble processing your request right now. Please try rephrasing your question."
+        return _chat_failure_reply(user_message)
     
-    return "I'm having trouble understanding your question. Could you please rephrase it?"
+    return NO_ANSWER_REPLY
+
+
+async def generate_chat_response_async(user_message: str, document_context: str, max_tokens: int = 800, model: str = "gpt-4o-mini") -> str:
+    """Async variant of generate_chat_response."""
+    if not user_message.strip():
+        return EMPTY_QUESTION_REPLY
+
+    client = _get_async_openai_client()
+    request = _chat_request(user_message, document_context, max_tokens)
+    last_error: Exception | None = None
+
+    for m in _candidate_models(model):
+        try:
+            resp = await _create_completion_async(client, model=m, **request)
+            content = (resp.choices[0].message.content or "").strip()
+            if content:
+                return content
+        except Exception as e:
+            last_error = e
+            continue
+
+    if last_error:
+        print(f"Chat generation failed: {last_error}")
+        return _chat_failure_reply(user_message)
+
+    return NO_ANSWER_REPLY
+
+
+def stream_chat_response(user_message: str, document_context: str, max_tokens: int = 800, model: str = "gpt-4o-mini"):
+    """
+    Streaming variant of generate_chat_response: yields the reply as text
+    deltas as the model produces them. Falls back to the next model only
+    while nothing has been yielded yet; a failure mid-stream ends the reply.
+    """
+    if not user_message.strip():
+        yield EMPTY_QUESTION_REPLY
+        return
+
+    client = _get_openai_client()
+    request = _chat_request(user_message, document_context, max_tokens)
+    last_error: Exception | None = None
+
+    for m in _candidate_models(model):
+        produced = False
+        try:
+            stream = _create_completion(client, model=m, stream=True, **request)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    produced = True
+                    yield delta
+            if produced:
+                return
+        except Exception as e:
+            if produced:
+                print(f"Chat stream interrupted: {e}")
+                return
+            last_error = e
+            continue
+
+    if last_error:
+        print(f"Chat generation failed: {last_error}")
+        yield _chat_failure_reply(user_message)
+        return
+
+    yield NO_ANSWER_REPLY
@@ -103,28 +103,53 @@ export default function ChatPanel({ documentId }) {
 
       const userId = user.id;
 
-      const res = await fetch(`${BACKEND}/chat`, {
+      const res = await fetch(`${BACKEND}/chat/stream`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
         body: JSON.stringify({ documentId, userId, message: msg }),
       });
 
-      const data = await res.json();
-
-      if (res.ok && data.reply) {
-        // Replace loading message with actual response
-        setMessages(prev => prev.map(m => 
-          m.id === loadingId 
-            ? { ...m, content: data.reply }
-            : m
-        ));
-      } else {
+      if (!res.ok || !res.body) {
+        const data = await res.json().catch(() => ({}));
         console.error("Chat error:", data);
         setMessages(prev => prev.map(m => 
           m.id === loadingId 
             ? { ...m, content: data.error || "Sorry, I'm having trouble processing your request. Please try again." }
             : m
         ));
+        return;
+      }
+
+      // Render the reply as it streams in (Server-Sent Events: delta, done, error)
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let reply = "";
+      const showReply = (content) => setMessages(prev => prev.map(m => 
+        m.id === loadingId ? { ...m, content } : m
+      ));
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = raw.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+          if (event === "delta") {
+            reply += payload.content;
+            showReply(reply);
+          } else if (event === "done") {
+            showReply(payload.reply);
+          } else if (event === "error") {
+            console.error("Chat error:", payload);
+            showReply(payload.error || "Sorry, I'm having trouble processing your request. Please try again.");
+          }
+        }
       }
     } catch (err) {
       console.error("Chat request failed:", err);
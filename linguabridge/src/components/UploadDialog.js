@@ -8,6 +8,11 @@ const supabase = createClient(
   process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY
 );
 
+const JOB_POLL_INTERVAL_MS = 2000;
+// Stop polling a job that makes no progress for this long, or runs past the cap
+const JOB_STALL_TIMEOUT_MS = 15 * 60 * 1000;
+const JOB_MAX_WAIT_MS = 2 * 60 * 60 * 1000;
+
 export default function UploadDialog({ open, onClose, onUploaded, onUploadStart }) {
   const inputRef = useRef(null);
   const [selectedFile, setSelectedFile] = useState(null);
@@ -19,6 +24,39 @@ export default function UploadDialog({ open, onClose, onUploaded, onUploadStart
 
   if (!open) return null;
 
+  const waitForJob = async (jobId) => {
+    const startedAt = Date.now();
+    let lastProgress = null;
+    let lastProgressAt = startedAt;
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const res = await fetch(`${BACKEND}/jobs/${jobId}`);
+      if (!res.ok) {
+        alert(`Upload failed: could not fetch job status (${res.status})`);
+        return null;
+      }
+      const job = await res.json();
+      if (job.status === "done") return job.result;
+      if (job.status === "failed") {
+        console.error("Upload job failed:", job);
+        alert(`Upload failed: ${job.error || "Unknown error"}`);
+        return null;
+      }
+
+      const progress = `${job.status}:${job.stage}:${job.pagesDone}`;
+      const now = Date.now();
+      if (progress !== lastProgress) {
+        lastProgress = progress;
+        lastProgressAt = now;
+      }
+      if (now - lastProgressAt > JOB_STALL_TIMEOUT_MS || now - startedAt > JOB_MAX_WAIT_MS) {
+        console.error("Upload job timed out:", job);
+        alert("Upload failed: processing is taking too long. Please try again later.");
+        return null;
+      }
+    }
+  };
+
   const handleFileChange = (e) => {
     const file = e.target.files?.[0];
     setSelectedFile(file);
@@ -63,8 +101,12 @@ export default function UploadDialog({ open, onClose, onUploaded, onUploadStart
         return;
       }
       
-      const json = await res.json();
-      console.log("Upload response:", json);
+      const queued = await res.json();
+      console.log("Upload response:", queued);
+
+      // Processing runs as a background job on the server; poll until it finishes
+      const json = queued.jobId ? await waitForJob(queued.jobId) : queued;
+      if (!json) return;
       
       if (!json.documentId) {
         console.error("No document ID in response:", json);